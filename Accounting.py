@@ -0,0 +1,126 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import matplotlib.pyplot as plt
+from ExecutionBudget import current_memory_mb
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ('parse', 'interpret', 'transform', 'render')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def phase(account, name):
+    # Lets callers wrap a phase whether or not accounting is enabled
+    return account.phase(name) if account is not None else nullcontext()
+
+
+class ResourceAccount:
+    # Records what one script run costs: time and the peak of Python
+    # allocations per phase, peak RSS, shapes and figures. Phases nest (a draw
+    # inside a transform inside the interpreter), and each phase is only
+    # charged for the time and allocations while it is the innermost one.
+    # finish() returns the record and appends it as one JSON line to output.
+    #
+    # tracemalloc and RSS are process-wide, so the numbers are only those of
+    # one run while no other run is accounted in the same process at the same
+    # time. Runs on threads of one process get mixed figures; run them in
+    # separate processes to account them one by one.
+
+    def __init__(self, output=None, script_id=None):
+        self.output = output
+        self.script_id = script_id
+        self.phases = {phase: {'seconds': 0.0, 'peak_kb': 0.0, 'calls': 0} for phase in PHASES}
+        # (phase, allocation baseline) for every open phase, innermost last
+        self.stack = []
+        self.phase_started = None
+        self.started_tracing = False
+        self.rss_start = None
+        self.peak_rss_start = None
+        self.start_time = None
+        self.start_cpu = None
+        self.figures_before = set()
+
+    def start(self):
+        # Tracing someone else started is left running when the run finishes
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.rss_start = current_memory_mb()
+        self.peak_rss_start = peak_rss_mb()
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.figures_before = set(plt.get_fignums())
+
+    def charge_current(self):
+        # Books the innermost phase's time and allocation peak so far and
+        # starts a new measurement for whichever phase runs next
+        now = time.perf_counter()
+        if self.stack:
+            phase, baseline = self.stack[-1]
+            stats = self.phases[phase]
+            stats['seconds'] += now - self.phase_started
+            peak = (tracemalloc.get_traced_memory()[1] - baseline) / 1024
+            stats['peak_kb'] = max(stats['peak_kb'], peak)
+        tracemalloc.reset_peak()
+        self.phase_started = now
+
+    @contextmanager
+    def phase(self, name):
+        self.charge_current()
+        self.stack.append((name, tracemalloc.get_traced_memory()[0]))
+        self.phases[name]['calls'] += 1
+        try:
+            yield
+        finally:
+            self.charge_current()
+            self.stack.pop()
+
+    def finish(self, drawer=None, status='ok'):
+        while self.stack:
+            self.charge_current()
+            self.stack.pop()
+        open_figures = set(plt.get_fignums()) - self.figures_before
+        peak = peak_rss_mb()
+        record = {
+            'script': self.script_id,
+            'status': status,
+            'seconds': time.perf_counter() - self.start_time,
+            'cpu_seconds': time.process_time() - self.start_cpu,
+            # The process's peak RSS (ru_maxrss) covers every earlier run as
+            # well, so RSS and the peak are also reported as growth since
+            # start(); the peak only grows when the run goes beyond any
+            # earlier peak of the process
+            'peak_rss_mb': peak,
+            'rss_start_mb': self.rss_start,
+            'rss_delta_mb': current_memory_mb() - self.rss_start,
+            'peak_rss_growth_mb': None if peak is None else peak - self.peak_rss_start,
+            'traced_peak_kb': max(stats['peak_kb'] for stats in self.phases.values()),
+            'phases': self.phases,
+            'shapes': len(drawer.shapes) if drawer is not None else 0,
+            'figures_created': drawer.figure_count if drawer is not None else 0,
+            # Pyplot figures opened by the run and never closed, plus figures
+            # still held by a headless drawer
+            'figures_unclosed': len(open_figures) + (len(drawer.figures) if drawer is not None else 0)
+        }
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        if self.output is not None:
+            with open(self.output, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return record
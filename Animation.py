@@ -0,0 +1,267 @@
+import os
+import struct
+import zlib
+import numpy as np
+import matplotlib.patches as patches
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+
+
+def shape_outline(shape):
+    # Vertices of polygon-like shapes as an (n, 2) array
+    if shape['type'] == 'triangle':
+        return np.asarray(shape['points'], dtype=float)
+    if shape['type'] == 'polygon':
+        return np.asarray(shape['vertices'], dtype=float)
+    x, y = shape['top_left']
+    return np.array([(x, y), (x + shape['width'], y), (x + shape['width'], y + shape['height']), (x, y + shape['height'])], dtype=float)
+
+
+def shape_extent(shape):
+    if shape['type'] == 'circle':
+        (x, y), radius = shape['center'], shape['radius']
+        return x - radius, y - radius, x + radius, y + radius
+    outline = shape_outline(shape)
+    (min_x, min_y), (max_x, max_y) = outline.min(axis=0), outline.max(axis=0)
+    return min_x, min_y, max_x, max_y
+
+
+def shape_patch(shape):
+    # A filled patch for the shape and the point its label goes on
+    style = dict(facecolor='blue', edgecolor='blue', alpha=0.3)
+    if shape['type'] == 'circle':
+        patch = patches.Circle(tuple(shape['center']), shape['radius'], **style)
+        anchor = shape['center']
+    elif shape['type'] == 'rectangle':
+        patch = patches.Rectangle(tuple(shape['top_left']), shape['width'], shape['height'], **style)
+        anchor = (shape['top_left'][0] + shape['width'] / 2, shape['top_left'][1] + shape['height'] / 2)
+    else:
+        outline = shape_outline(shape)
+        patch = patches.Polygon(outline, closed=True, **style)
+        anchor = outline.mean(axis=0)
+    return patch, anchor
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class APNGWriter:
+    # Writes an animated PNG one frame at a time. Each frame is compressed as
+    # soon as it arrives and only the region that differs from the previous
+    # frame is stored, so memory stays at one frame whatever the length. The
+    # frame count in the header is filled in on close.
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.duration = int(1000 / fps)
+        self.file = None
+        self.previous = None
+        self.sequence = 0
+        self.frame_count = 0
+        self.control_position = None
+
+    def chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+
+    def animation_control(self):
+        # Frame count and number of plays, 0 meaning forever
+        return struct.pack('>II', self.frame_count, 0)
+
+    def compress(self, region):
+        # Every row uses the Up filter: the difference to the row above
+        height = region.shape[0]
+        rows = region.reshape(height, -1)
+        filtered = np.empty((height, rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[:, 1:] = rows
+        filtered[1:, 1:] -= rows[:-1]
+        return zlib.compress(filtered.tobytes(), 6)
+
+    def add(self, frame):
+        # frame is an (height, width, 3) uint8 array
+        height, width = frame.shape[:2]
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+            self.file.write(PNG_SIGNATURE)
+            self.chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            self.control_position = self.file.tell()
+            self.chunk(b'acTL', self.animation_control())
+            x0, y0, x1, y1 = 0, 0, width, height
+        else:
+            changed = (frame != self.previous).any(axis=2)
+            rows = np.flatnonzero(changed.any(axis=1))
+            columns = np.flatnonzero(changed.any(axis=0))
+            if len(rows):
+                x0, y0, x1, y1 = int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+            else:
+                # An unchanged frame still needs a region to hold its delay
+                x0, y0, x1, y1 = 0, 0, 1, 1
+        self.chunk(b'fcTL', struct.pack('>IIIIIHHBB', self.sequence, x1 - x0, y1 - y0, x0, y0, self.duration, 1000, 0, 0))
+        self.sequence += 1
+        data = self.compress(frame[y0:y1, x0:x1])
+        if self.frame_count == 0:
+            self.chunk(b'IDAT', data)
+        else:
+            self.chunk(b'fdAT', struct.pack('>I', self.sequence) + data)
+            self.sequence += 1
+        self.previous = np.array(frame, dtype=np.uint8)
+        self.frame_count += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        self.chunk(b'IEND', b'')
+        self.file.seek(self.control_position)
+        self.chunk(b'acTL', self.animation_control())
+        self.file.close()
+        self.file = None
+        self.previous = None
+
+
+class Animation:
+    # Records every draw of an existing shape as a frame on one persistent
+    # canvas. Shapes that have not changed since the last full redraw live in a cached
+    # background bitmap, so a frame only costs restoring that bitmap and
+    # drawing the shapes being animated. Frames go to a numbered PNG sequence
+    # in a directory, or are streamed into an animated PNG when output ends
+    # in ".png".
+
+    def __init__(self, output, limits=None, figsize=(6, 6), dpi=100, fps=10, max_active=16, margin=5):
+        self.output = output
+        self.apng = output.lower().endswith('.png')
+        if not self.apng:
+            os.makedirs(output, exist_ok=True)
+        self.fps = fps
+        self.max_active = max_active
+        self.margin = margin
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.ax.grid(True)
+        self.ax.set_aspect('equal', adjustable='box')
+        self.limits = limits
+        if limits is not None:
+            self.apply_limits(limits)
+        self.fixed_limits = limits is not None
+
+        # name -> (kind, patch, label)
+        self.artists = {}
+        self.active = set()
+        self.background = None
+        # Set when shapes were added since the last frame
+        self.pending = False
+        self.writer = APNGWriter(output, fps) if self.apng else None
+        self.frame_count = 0
+
+    def apply_limits(self, limits):
+        min_x, min_y, max_x, max_y = limits
+        self.ax.set_xlim(min_x, max_x)
+        self.ax.set_ylim(min_y, max_y)
+        self.limits = limits
+
+    def fit(self, shape):
+        # Grows the view to include the shape; returns True if it changed
+        if self.fixed_limits:
+            return False
+        min_x, min_y, max_x, max_y = shape_extent(shape)
+        if self.limits is not None:
+            lx, ly, ux, uy = self.limits
+            if lx <= min_x and ly <= min_y and max_x <= ux and max_y <= uy:
+                return False
+            min_x, min_y = min(min_x, lx), min(min_y, ly)
+            max_x, max_y = max(max_x, ux), max(max_y, uy)
+        self.apply_limits((min_x - self.margin, min_y - self.margin, max_x + self.margin, max_y + self.margin))
+        return True
+
+    def create_artists(self, name, shape):
+        patch, anchor = shape_patch(shape)
+        self.ax.add_patch(patch)
+        label = self.ax.text(anchor[0], anchor[1], name, fontsize=12, color="red", fontweight="bold")
+        self.artists[name] = (shape['type'], patch, label)
+
+    def update_artists(self, name, shape):
+        kind, patch, label = self.artists[name]
+        if kind != shape['type']:
+            # A rotated rectangle turns into a polygon, so the patch is replaced
+            patch.remove()
+            label.remove()
+            animated = name in self.active
+            self.create_artists(name, shape)
+            if animated:
+                self.set_animated(name, True)
+            return
+        if kind == 'circle':
+            patch.set_center(tuple(shape['center']))
+            patch.set_radius(shape['radius'])
+            label.set_position(tuple(shape['center']))
+        elif kind == 'rectangle':
+            patch.set_xy(tuple(shape['top_left']))
+            patch.set_width(shape['width'])
+            patch.set_height(shape['height'])
+            label.set_position((shape['top_left'][0] + shape['width'] / 2, shape['top_left'][1] + shape['height'] / 2))
+        else:
+            outline = shape_outline(shape)
+            patch.set_xy(outline)
+            label.set_position(tuple(outline.mean(axis=0)))
+
+    def set_animated(self, name, animated):
+        _, patch, label = self.artists[name]
+        patch.set_animated(animated)
+        label.set_animated(animated)
+
+    def draw(self, name, shape):
+        if self.fit(shape):
+            self.background = None
+        if name not in self.artists:
+            # A new shape only joins the scene; it is painted straight onto the
+            # cached background and shows up in the next frame
+            self.create_artists(name, shape)
+            if self.background is not None:
+                _, patch, label = self.artists[name]
+                self.canvas.restore_region(self.background)
+                self.ax.draw_artist(patch)
+                self.ax.draw_artist(label)
+                self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+            self.pending = True
+            return
+
+        self.update_artists(name, shape)
+        if name not in self.active:
+            if len(self.active) >= self.max_active:
+                for other in self.active:
+                    self.set_animated(other, False)
+                self.active.clear()
+            self.active.add(name)
+            self.set_animated(name, True)
+            self.background = None
+        self.render_frame()
+
+    def render_frame(self):
+        if self.background is None:
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        else:
+            self.canvas.restore_region(self.background)
+        for name in self.active:
+            _, patch, label = self.artists[name]
+            self.ax.draw_artist(patch)
+            self.ax.draw_artist(label)
+        self.write_frame()
+        self.pending = False
+
+    def write_frame(self):
+        frame = np.asarray(self.canvas.buffer_rgba())[:, :, :3]
+        self.frame_count += 1
+        if self.apng:
+            self.writer.add(frame)
+        else:
+            Image.fromarray(np.ascontiguousarray(frame)).save(os.path.join(self.output, f"frame_{self.frame_count:05d}.png"))
+
+    def close(self):
+        if self.pending:
+            self.render_frame()
+        if self.apng:
+            self.writer.close()
+        return self.frame_count
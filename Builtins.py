@@ -0,0 +1,86 @@
+import math
+from functools import reduce
+import numpy as np
+
+# Built-in functions work on numbers and on NumPy arrays element-wise. Angles
+# are in degrees, as everywhere else in the language.
+
+
+def dsl_sin(x):
+    if isinstance(x, np.ndarray):
+        return np.sin(np.radians(x))
+    return math.sin(math.radians(float(x)))
+
+
+def dsl_cos(x):
+    if isinstance(x, np.ndarray):
+        return np.cos(np.radians(x))
+    return math.cos(math.radians(float(x)))
+
+
+def dsl_tan(x):
+    if isinstance(x, np.ndarray):
+        return np.tan(np.radians(x))
+    return math.tan(math.radians(float(x)))
+
+
+def dsl_sqrt(x):
+    if isinstance(x, np.ndarray):
+        return np.sqrt(x)
+    return math.sqrt(float(x))
+
+
+def dsl_abs(x):
+    if isinstance(x, np.ndarray):
+        return np.abs(x)
+    return abs(float(x))
+
+
+def dsl_arange(*args):
+    # arange(stop), arange(start, stop) or arange(start, stop, step)
+    return np.arange(*[float(arg) for arg in args], dtype=np.float64)
+
+
+def dsl_linspace(start, stop, count):
+    return np.linspace(float(start), float(stop), int(count))
+
+
+def dsl_len(x):
+    if isinstance(x, (np.ndarray, str)):
+        return len(x)
+    return 1
+
+
+def dsl_sum(x):
+    return float(np.sum(x))
+
+
+def _extreme(reduce_array, element_wise, args):
+    # One argument reduces an array, several are compared element-wise
+    if len(args) == 1:
+        return float(reduce_array(args[0]))
+    result = reduce(element_wise, args)
+    return result if isinstance(result, np.ndarray) else float(result)
+
+
+def dsl_min(*args):
+    return _extreme(np.min, np.minimum, args)
+
+
+def dsl_max(*args):
+    return _extreme(np.max, np.maximum, args)
+
+
+BUILTIN_FUNCTIONS = {
+    'sin': dsl_sin,
+    'cos': dsl_cos,
+    'tan': dsl_tan,
+    'sqrt': dsl_sqrt,
+    'abs': dsl_abs,
+    'arange': dsl_arange,
+    'linspace': dsl_linspace,
+    'len': dsl_len,
+    'sum': dsl_sum,
+    'min': dsl_min,
+    'max': dsl_max
+}
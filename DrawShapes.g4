@@ -12,6 +12,8 @@ statement: assignment
          | shape
          | transformation
          | printStmt
+         | overlapStmt
+         | importStmt
          | returnStmt;
 
 assignment: ID '=' (expression | STRING);
@@ -42,7 +44,9 @@ functionCall: ID '(' (expression (',' expression)*)? ')';
 
 expression: term (('+' | '-' | '*' | '/') term)*;
 
-term: ID | NUMBER | '(' expression ')' | functionCall;
+term: ID | NUMBER | '(' expression ')' | functionCall | array;
+
+array: '[' (expression (',' expression)*)? ']';
 
 literal: NUMBER | 'true' | 'false' | STRING;
 
@@ -50,11 +54,11 @@ shape: triangleShape | circleShape | rectangleShape | polygonShape;
 
 triangleShape: 'triangle' ID point ',' point ',' point ('draw')?;
 
-circleShape: 'circle' ID 'center' point 'radius' NUMBER ('draw')?;
+circleShape: 'circle' ID 'center' point 'radius' expression ('draw')?;
 
-rectangleShape: 'rectangle' ID 'top' '-' 'left' point 'width' NUMBER 'height' NUMBER ('draw')?;
+rectangleShape: 'rectangle' ID 'top' '-' 'left' point 'width' expression 'height' expression ('draw')?;
 
-polygonShape: 'polygon' ID 'vertices' '(' point (',' point)+ ')' ('draw')?;
+polygonShape: 'polygon' ID ('vertices' '(' point (',' point)+ ')' | 'from' STRING) ('draw')?;
 
 transformation: 
       rotateTransform
@@ -75,6 +79,10 @@ addFeatureTransform: 'add' ('median' | 'bisector' | 'perpendicular') 'to' ID 'fr
 
 printStmt: 'print' (STRING | expression);
 
+overlapStmt: 'overlaps' (ID)?;
+
+importStmt: 'import' STRING;
+
 point: '(' expression ',' expression ')';
 
 // Lexer Rules
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class BudgetExceededError(Exception):
+    def __init__(self, kind, limit, stats):
+        self.kind = kind
+        self.limit = limit
+        self.stats = stats
+        super().__init__(f"{kind} budget exceeded (limit {limit})")
+
+    def __reduce__(self):
+        # Raised in pool workers and pickled back to the parent
+        return (self.__class__, (self.kind, self.limit, self.stats))
+
+    def to_dict(self):
+        return {
+            'error': 'budget_exceeded',
+            'kind': self.kind,
+            'limit': self.limit,
+            'stats': dict(self.stats)
+        }
+
+
+def current_memory_mb():
+    # Current resident set size on Linux, peak RSS elsewhere
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class ExecutionBudget:
+    def __init__(self, max_steps=None, max_seconds=None, max_shapes=None,
+                 max_memory_mb=None, max_call_depth=None, check_interval=1000):
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.max_shapes = max_shapes
+        self.max_memory_mb = max_memory_mb
+        self.max_call_depth = max_call_depth
+        self.check_interval = check_interval
+        self.start()
+
+    @classmethod
+    def from_limits(cls, limits):
+        # Rebuilds a budget from chunk_limits() in a pool worker; the time
+        # left is measured from the shared wall-clock deadline
+        max_seconds = None
+        if limits['deadline'] is not None:
+            max_seconds = limits['deadline'] - time.time()
+        return cls(max_steps=limits['max_steps'], max_seconds=max_seconds, max_shapes=limits['max_shapes'],
+                   max_memory_mb=limits['max_memory_mb'], check_interval=limits['check_interval'])
+
+    def start(self):
+        self.steps = 0
+        self.call_depth = 0
+        self.deepest_call = 0
+        self.shapes = 0
+        self.memory_mb = 0.0
+        self.start_time = time.perf_counter()
+        self.next_check = self._next_check()
+
+    def _next_check(self):
+        # Time and memory are only sampled every check_interval steps, but the
+        # step limit itself is enforced exactly
+        next_check = self.steps + self.check_interval
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        return next_check
+
+    def stats(self):
+        return {
+            'steps': self.steps,
+            'elapsed_seconds': round(time.perf_counter() - self.start_time, 6),
+            'shapes': self.shapes,
+            'memory_mb': round(self.memory_mb, 2),
+            'call_depth': self.call_depth,
+            'deepest_call': self.deepest_call
+        }
+
+    def limit(self, kind):
+        return {'steps': self.max_steps, 'time': self.max_seconds, 'shapes': self.max_shapes,
+                'memory': self.max_memory_mb, 'call_depth': self.max_call_depth}[kind]
+
+    def chunk_limits(self):
+        # What is left of this budget for work done in another process, as
+        # plain values. A chunk may use every remaining step, since its steps
+        # all count here as well. Shapes a chunk creates may replace existing
+        # ones, so it gets the whole shape limit and the exact count is
+        # checked when its shapes are merged back.
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            'max_steps': None if self.max_steps is None else self.max_steps - self.steps,
+            'deadline': None if self.max_seconds is None else time.time() + self.max_seconds - elapsed,
+            'max_shapes': self.max_shapes,
+            'max_memory_mb': self.max_memory_mb,
+            'check_interval': self.check_interval
+        }
+
+    def exceeded(self, kind, limit):
+        raise BudgetExceededError(kind, limit, self.stats())
+
+    def check(self):
+        if self.max_steps is not None and self.steps > self.max_steps:
+            self.exceeded('steps', self.max_steps)
+        if self.max_seconds is not None and time.perf_counter() - self.start_time > self.max_seconds:
+            self.exceeded('time', self.max_seconds)
+        if self.max_memory_mb is not None:
+            self.memory_mb = current_memory_mb()
+            if self.memory_mb > self.max_memory_mb:
+                self.exceeded('memory', self.max_memory_mb)
+        self.next_check = self._next_check()
+
+    def check_shapes(self, shape_count):
+        self.shapes = shape_count
+        if self.max_shapes is not None and shape_count > self.max_shapes:
+            self.exceeded('shapes', self.max_shapes)
+
+    def enter_call(self):
+        self.call_depth += 1
+        if self.call_depth > self.deepest_call:
+            self.deepest_call = self.call_depth
+        if self.max_call_depth is not None and self.call_depth > self.max_call_depth:
+            self.exceeded('call_depth', self.max_call_depth)
+
+    def exit_call(self):
+        self.call_depth -= 1
@@ -0,0 +1,69 @@
+import numpy as np
+
+FEATURE_TYPES = ('median', 'bisector', 'perpendicular')
+
+
+def closest_vertex_indices(triangles, point):
+    # triangles has shape (n, 3, 2); ties go to the first vertex like min()
+    distances = ((triangles - np.asarray(point, dtype=float)) ** 2).sum(axis=2)
+    return distances.argmin(axis=1)
+
+
+def _vertex_and_opposite_side(triangles, vertex_indices):
+    # vertex_indices is (n,) or (n, k), the results gain a trailing xy axis
+    vertex_indices = np.asarray(vertex_indices)
+    columns = vertex_indices.reshape(len(triangles), -1, 1)
+    shape = vertex_indices.shape + (2,)
+    vertex = np.take_along_axis(triangles, columns, axis=1).reshape(shape)
+    side1 = np.take_along_axis(triangles, (columns + 1) % 3, axis=1).reshape(shape)
+    side2 = np.take_along_axis(triangles, (columns + 2) % 3, axis=1).reshape(shape)
+    return vertex, side1, side2
+
+
+def medians(vertex, side1, side2):
+    return np.stack([vertex, (side1 + side2) / 2], axis=-2)
+
+
+def bisectors(vertex, side1, side2):
+    v1 = side1 - vertex
+    v2 = side2 - vertex
+    v1_norm = np.hypot(v1[..., 0], v1[..., 1])[..., None]
+    v2_norm = np.hypot(v2[..., 0], v2[..., 1])[..., None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bisector = v1 / v1_norm + v2 / v2_norm
+        bisector_norm = np.hypot(bisector[..., 0], bisector[..., 1])[..., None]
+        # Bisector length follows the longer adjacent side to keep it in proportion
+        end = vertex + bisector / bisector_norm * np.maximum(v1_norm, v2_norm)
+    end[(bisector_norm[..., 0] == 0) | ~np.isfinite(end).all(axis=-1)] = np.nan
+    return np.stack([vertex, end], axis=-2)
+
+
+def perpendiculars(vertex, side1, side2):
+    line_dir = side2 - side1
+    line_length_sq = (line_dir ** 2).sum(axis=-1)[..., None]
+    # Project the vertex onto the opposite side to find the foot point
+    with np.errstate(divide='ignore', invalid='ignore'):
+        projection = ((vertex - side1) * line_dir).sum(axis=-1)[..., None] / line_length_sq
+        foot = side1 + projection * line_dir
+    foot[line_length_sq[..., 0] == 0] = np.nan
+    return np.stack([vertex, foot], axis=-2)
+
+
+FEATURE_FUNCTIONS = {
+    'median': medians,
+    'bisector': bisectors,
+    'perpendicular': perpendiculars
+}
+
+
+def feature_segments(triangles, vertex_indices, feature_type):
+    # Returns segment start and end points shaped vertex_indices.shape + (2, 2),
+    # rows of degenerate triangles are NaN
+    return all_feature_segments(triangles, vertex_indices, (feature_type,))[feature_type]
+
+
+def all_feature_segments(triangles, vertex_indices, feature_types=FEATURE_TYPES):
+    # Several feature types at once, sharing the gathered vertices and sides
+    triangles = np.asarray(triangles, dtype=float).reshape(-1, 3, 2)
+    corners = _vertex_and_opposite_side(triangles, vertex_indices)
+    return {feature_type: FEATURE_FUNCTIONS[feature_type](*corners) for feature_type in feature_types}
@@ -0,0 +1,201 @@
+import itertools
+import json
+import os
+import numpy as np
+
+CSV_CHUNK_ROWS = 65536
+GEOJSON_CHUNK_CHARS = 1 << 20
+# Raw binary files are little-endian whatever the platform
+BINARY_DTYPES = {'float32': np.dtype('<f4'), 'float64': np.dtype('<f8')}
+FORMATS = {
+    '.csv': 'csv',
+    '.txt': 'csv',
+    '.json': 'geojson',
+    '.geojson': 'geojson',
+    '.f32': 'float32',
+    '.f64': 'float64',
+    '.bin': 'float64'
+}
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown vertex file format '{extension}'")
+    return FORMATS[extension]
+
+
+def load_vertices(path, fmt=None):
+    # Returns polygon vertices as an (n, 2) array. Raw binary files are memory
+    # mapped rather than read, CSV files are parsed in fixed size chunks.
+    fmt = fmt or detect_format(path)
+    if fmt == 'csv':
+        vertices = load_csv(path)
+    elif fmt == 'geojson':
+        vertices = load_geojson(path)
+    elif fmt in BINARY_DTYPES:
+        vertices = load_binary(path, BINARY_DTYPES[fmt])
+    else:
+        raise ValueError(f"Unknown vertex file format '{fmt}'")
+    if len(vertices) < 3:
+        raise ValueError(f"{path} has fewer than 3 vertices")
+    return vertices
+
+
+def load_binary(path, dtype):
+    # Interleaved x, y values without a header
+    if os.path.getsize(path) % (2 * dtype.itemsize):
+        raise ValueError(f"{path} does not hold whole {dtype.name} x, y pairs")
+    return np.memmap(path, dtype=dtype, mode='r').reshape(-1, 2)
+
+
+def load_csv(path):
+    chunks = []
+    with open(path) as f:
+        first = f.readline()
+        # A first line that does not start with a number is a header
+        try:
+            float(first.split(',')[0])
+            lines = itertools.chain([first], f)
+        except ValueError:
+            lines = f
+        while True:
+            block = list(itertools.islice(lines, CSV_CHUNK_ROWS))
+            if not block:
+                break
+            chunks.append(np.loadtxt(block, delimiter=',', usecols=(0, 1), ndmin=2, dtype=np.float64))
+    if not chunks:
+        return np.zeros((0, 2), dtype=np.float64)
+    return np.concatenate(chunks)
+
+
+def _first_polygon(geometry):
+    kind = geometry.get('type')
+    if kind == 'FeatureCollection':
+        for feature in geometry['features']:
+            ring = _first_polygon(feature)
+            if ring is not None:
+                return ring
+    elif kind == 'Feature':
+        return _first_polygon(geometry['geometry'] or {})
+    elif kind == 'GeometryCollection':
+        for part in geometry['geometries']:
+            ring = _first_polygon(part)
+            if ring is not None:
+                return ring
+    elif kind == 'Polygon':
+        return geometry['coordinates'][0]
+    elif kind == 'MultiPolygon':
+        return geometry['coordinates'][0][0]
+    elif kind == 'LineString':
+        return geometry['coordinates']
+    return None
+
+
+class JSONStream:
+    # Decodes a JSON document value by value from a text file, so only the
+    # value being decoded has to fit in memory
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        # Reads at least as much again as is left unread, so a value that
+        # takes several reads is still decoded in linear time overall
+        chunk = self.f.read(max(GEOJSON_CHUNK_CHARS, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def peek(self):
+        # The next character that is not whitespace, '' at the end
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ''
+            self.fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of '{chars}' in JSON, found '{char}'")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # A number may go on past the end of the buffer
+            if end == len(self.buffer) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def keys(self):
+        # Yields the key of every member of an object; the caller reads the
+        # value before asking for the next key
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def items(self):
+        # Yields once per array item; the caller reads the item
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+
+def _stream_first_polygon(stream):
+    # Feature and geometry lists are decoded one entry at a time and reading
+    # stops at the first polygon; other members are decoded whole
+    if stream.peek() != '{':
+        return _first_polygon(stream.value())
+    members = {}
+    for key in stream.keys():
+        if key in ('features', 'geometries') and stream.peek() == '[':
+            for _ in stream.items():
+                ring = _first_polygon(stream.value())
+                if ring is not None:
+                    return ring
+            members[key] = []
+        else:
+            members[key] = stream.value()
+    return _first_polygon(members)
+
+
+def load_geojson(path):
+    with open(path) as f:
+        ring = _stream_first_polygon(JSONStream(f))
+    if ring is None:
+        raise ValueError(f"{path} has no polygon geometry")
+    # Only x and y are kept; GeoJSON rings repeat the first vertex at the end
+    vertices = np.asarray(ring, dtype=np.float64)[:, :2]
+    if len(vertices) > 1 and (vertices[0] == vertices[-1]).all():
+        vertices = vertices[:-1]
+    return vertices
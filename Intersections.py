@@ -0,0 +1,242 @@
+import numpy as np
+from Animation import shape_outline, shape_extent
+
+# Shapes are treated as closed filled regions, so shapes that only touch
+# count as overlapping.
+
+# Box pairs examined at once by candidate_pairs
+CANDIDATE_BATCH = 1 << 20
+
+
+def shape_extents(shapes, names):
+    # (n, 4) array of min_x, min_y, max_x, max_y; triangles, circles and
+    # rectangles are handled per type in one numpy pass each
+    extents = np.empty((len(names), 4), dtype=np.float64)
+    by_type = {}
+    for row, name in enumerate(names):
+        by_type.setdefault(shapes[name]['type'], []).append(row)
+    for kind, rows in by_type.items():
+        members = [shapes[names[row]] for row in rows]
+        if kind == 'triangle':
+            points = np.array([shape['points'] for shape in members], dtype=np.float64)
+            extents[rows, :2] = points.min(axis=1)
+            extents[rows, 2:] = points.max(axis=1)
+        elif kind == 'circle':
+            values = np.array([(shape['center'][0], shape['center'][1], shape['radius']) for shape in members], dtype=np.float64)
+            radius = np.abs(values[:, 2:])
+            extents[rows, :2] = values[:, :2] - radius
+            extents[rows, 2:] = values[:, :2] + radius
+        elif kind == 'rectangle':
+            values = np.array([(shape['top_left'][0], shape['top_left'][1], shape['width'], shape['height']) for shape in members], dtype=np.float64)
+            corners = values[:, :2] + values[:, 2:]
+            extents[rows, :2] = np.minimum(values[:, :2], corners)
+            extents[rows, 2:] = np.maximum(values[:, :2], corners)
+        else:
+            extents[rows] = [shape_extent(shape) for shape in members]
+    return extents
+
+
+def _covered_cells(boxes, first_cell, last_cell, columns):
+    # One (box, cell id) entry per cell each box covers
+    widths = last_cell[:, 0] - first_cell[:, 0] + 1
+    counts = widths * (last_cell[:, 1] - first_cell[:, 1] + 1)
+    rows = np.repeat(np.arange(len(boxes)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = ((first_cell[rows, 1] + offsets // widths[rows]) * columns +
+             first_cell[rows, 0] + offsets % widths[rows])
+    return boxes[rows], cells
+
+
+def _batch_pairs(query_boxes, query_cells, starts, counts, entry_boxes):
+    # Every query box paired with each entry in its cell's run of entries
+    total = int(counts.sum())
+    a = np.repeat(query_boxes, counts)
+    b = entry_boxes[np.repeat(starts, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)]
+    return a, b, np.repeat(query_cells, counts)
+
+
+def candidate_pairs(extents):
+    # Hierarchical grid: level L has cells of base * 2**L, and every box is
+    # entered at the finest level whose cells are at least as large as the
+    # box, so it covers at most 2 x 2 cells there. Each box then looks up
+    # the boxes sharing a cell with it on its own level and every coarser
+    # one. Large boxes therefore never flood the fine cells, and the work
+    # stays proportional to the boxes plus the pairs whose cells meet. A
+    # pair sharing several cells is only kept in the cell holding the lower
+    # left corner of the two boxes' intersection, and only pairs whose
+    # ranges meet on both axes are returned, as index pairs into extents.
+    n = len(extents)
+    empty = np.zeros((0, 2), dtype=np.int64)
+    if n < 2:
+        return empty
+    low = extents[:, :2].min(axis=0)
+    span = extents[:, 2:].max(axis=0) - low
+    sizes = np.maximum(extents[:, 2] - extents[:, 0], extents[:, 3] - extents[:, 1])
+    # The finest cells follow the typical box, but never make a grid of
+    # more than about 4 cells per box, over the area or along one axis
+    base = max(float(np.median(sizes)), float(np.sqrt(span[0] * span[1] / (4 * n))), float(span.max()) / (4 * n))
+    if not base > 0:
+        base = 1.0
+    levels = np.ceil(np.log2(np.maximum(sizes, base) / base)).astype(np.int64)
+    # Rounding in log2 must not leave a box larger than its cells
+    levels += sizes > base * np.exp2(levels)
+
+    firsts, seconds = [], []
+    for level in np.unique(levels).tolist():
+        cell = base * 2.0 ** level
+        columns = int(span[0] // cell) + 1
+        members = np.flatnonzero(levels == level)
+        entry_boxes, entry_cells = _covered_cells(
+            members, np.floor((extents[members, :2] - low) / cell).astype(np.int64),
+            np.floor((extents[members, 2:] - low) / cell).astype(np.int64), columns)
+        order = np.argsort(entry_cells, kind='stable')
+        entry_boxes = entry_boxes[order]
+        entry_cells = entry_cells[order]
+
+        queries = np.flatnonzero(levels <= level)
+        query_boxes, query_cells = _covered_cells(
+            queries, np.floor((extents[queries, :2] - low) / cell).astype(np.int64),
+            np.floor((extents[queries, 2:] - low) / cell).astype(np.int64), columns)
+        starts = np.searchsorted(entry_cells, query_cells, side='left')
+        counts = np.searchsorted(entry_cells, query_cells, side='right') - starts
+        # Lookups are expanded in batches, so the memory needed beyond the
+        # result stays bounded however many boxes share a cell
+        ends = np.cumsum(counts)
+        batch_start = 0
+        while batch_start < len(counts):
+            limit = (ends[batch_start - 1] if batch_start else 0) + CANDIDATE_BATCH
+            batch_end = max(int(np.searchsorted(ends, limit, side='right')), batch_start + 1)
+            batch = slice(batch_start, batch_end)
+            batch_start = batch_end
+            a, b, shared = _batch_pairs(query_boxes[batch], query_cells[batch], starts[batch], counts[batch], entry_boxes)
+            # Boxes of the same level find each other from both sides
+            keep = (levels[a] < level) | (a < b)
+            a, b, shared = a[keep], b[keep], shared[keep]
+            meet = ((extents[a, 0] <= extents[b, 2]) & (extents[b, 0] <= extents[a, 2]) &
+                    (extents[a, 1] <= extents[b, 3]) & (extents[b, 1] <= extents[a, 3]))
+            a, b, shared = a[meet], b[meet], shared[meet]
+            corner = np.floor((np.maximum(extents[a, :2], extents[b, :2]) - low) / cell).astype(np.int64)
+            keep = corner[:, 1] * columns + corner[:, 0] == shared
+            firsts.append(a[keep])
+            seconds.append(b[keep])
+    if not firsts:
+        return empty
+    return np.column_stack([np.concatenate(firsts), np.concatenate(seconds)])
+
+
+def _cross(o, a, b):
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+
+def _on_segment(a, b, p):
+    return ((np.minimum(a[..., 0], b[..., 0]) <= p[..., 0]) & (p[..., 0] <= np.maximum(a[..., 0], b[..., 0])) &
+            (np.minimum(a[..., 1], b[..., 1]) <= p[..., 1]) & (p[..., 1] <= np.maximum(a[..., 1], b[..., 1])))
+
+
+def segments_intersect(p1, p2, q1, q2):
+    # Element-wise over broadcast arrays of segment end points
+    d1 = _cross(q1, q2, p1)
+    d2 = _cross(q1, q2, p2)
+    d3 = _cross(p1, p2, q1)
+    d4 = _cross(p1, p2, q2)
+    proper = (((d1 > 0) & (d2 < 0)) | ((d1 < 0) & (d2 > 0))) & (((d3 > 0) & (d4 < 0)) | ((d3 < 0) & (d4 > 0)))
+    touching = (((d1 == 0) & _on_segment(q1, q2, p1)) | ((d2 == 0) & _on_segment(q1, q2, p2)) |
+                ((d3 == 0) & _on_segment(p1, p2, q1)) | ((d4 == 0) & _on_segment(p1, p2, q2)))
+    return proper | touching
+
+
+def point_in_polygon(point, polygon):
+    # Even-odd ray casting against every edge at once
+    x, y = point
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    crosses = (a[:, 1] > y) != (b[:, 1] > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+
+
+def _edges_near(polygon, box):
+    # Edges whose bounding box meets box, as (start, end) arrays
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    near = ((np.minimum(a[:, 0], b[:, 0]) <= box[2]) & (np.maximum(a[:, 0], b[:, 0]) >= box[0]) &
+            (np.minimum(a[:, 1], b[:, 1]) <= box[3]) & (np.maximum(a[:, 1], b[:, 1]) >= box[1]))
+    return a[near], b[near]
+
+
+def polygons_overlap(a, b):
+    # Either some edges cross, or one polygon lies inside the other. Only
+    # edges inside the common bounding box can cross.
+    box = (max(a[:, 0].min(), b[:, 0].min()), max(a[:, 1].min(), b[:, 1].min()),
+           min(a[:, 0].max(), b[:, 0].max()), min(a[:, 1].max(), b[:, 1].max()))
+    if box[0] > box[2] or box[1] > box[3]:
+        return False
+    a1, a2 = _edges_near(a, box)
+    b1, b2 = _edges_near(b, box)
+    if len(a1) and len(b1):
+        if segments_intersect(a1[:, None], a2[:, None], b1[None], b2[None]).any():
+            return True
+    return point_in_polygon(a[0], b) or point_in_polygon(b[0], a)
+
+
+def circle_polygon_overlap(center, radius, polygon):
+    center = np.asarray(center, dtype=np.float64)
+    if point_in_polygon(center, polygon):
+        return True
+    a = polygon
+    edge = np.roll(polygon, -1, axis=0) - a
+    length_squared = (edge ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(((center - a) * edge).sum(axis=1) / length_squared, 0, 1)
+    t = np.nan_to_num(t)
+    closest = a + t[:, None] * edge
+    return bool((np.hypot(*(closest - center).T) <= radius).any())
+
+
+def shapes_overlap(first, second):
+    if first['type'] == 'circle' and second['type'] == 'circle':
+        distance = np.hypot(first['center'][0] - second['center'][0], first['center'][1] - second['center'][1])
+        return bool(distance <= first['radius'] + second['radius'])
+    if first['type'] == 'circle':
+        return circle_polygon_overlap(first['center'], first['radius'], shape_outline(second))
+    if second['type'] == 'circle':
+        return circle_polygon_overlap(second['center'], second['radius'], shape_outline(first))
+    return polygons_overlap(shape_outline(first), shape_outline(second))
+
+
+def find_overlaps(shapes, names=None):
+    # All pairs of overlapping shapes as (name, name) tuples, each pair once
+    # with its names in the order of names
+    names = list(shapes) if names is None else list(names)
+    pairs = candidate_pairs(shape_extents(shapes, names))
+    pairs.sort(axis=1)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    kinds = np.array([shapes[name]['type'] == 'circle' for name in names], dtype=bool)
+
+    # Circle pairs are decided for all candidates at once
+    both_circles = kinds[pairs[:, 0]] & kinds[pairs[:, 1]] if len(pairs) else np.zeros(0, dtype=bool)
+    result = np.zeros(len(pairs), dtype=bool)
+    if both_circles.any():
+        circles = pairs[both_circles]
+        rows = np.unique(circles)
+        values = np.zeros((len(names), 3), dtype=np.float64)
+        values[rows] = [(shapes[names[i]]['center'][0], shapes[names[i]]['center'][1], shapes[names[i]]['radius'])
+                        for i in rows.tolist()]
+        first, second = values[circles[:, 0]], values[circles[:, 1]]
+        result[both_circles] = np.hypot(*(first[:, :2] - second[:, :2]).T) <= first[:, 2] + second[:, 2]
+    for index in np.flatnonzero(~both_circles).tolist():
+        i, j = pairs[index]
+        result[index] = shapes_overlap(shapes[names[i]], shapes[names[j]])
+    return [(names[i], names[j]) for i, j in pairs[result].tolist()]
+
+
+def brute_force_overlaps(shapes, names=None):
+    # Reference implementation comparing every pair
+    names = list(shapes) if names is None else list(names)
+    overlaps = []
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            if shapes_overlap(shapes[names[i]], shapes[names[j]]):
+                overlaps.append((names[i], names[j]))
+    return overlaps
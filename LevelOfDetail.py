@@ -0,0 +1,98 @@
+import math
+import numpy as np
+import matplotlib
+
+
+def douglas_peucker(points, tolerance):
+    # Keeps the vertices that deviate more than tolerance from the simplified
+    # line. Each split measures all of its inner points in one numpy pass.
+    n = len(points)
+    if n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a = points[start]
+        dx, dy = points[end] - a
+        inner = points[start + 1:end] - a
+        length = math.hypot(dx, dy)
+        if length == 0:
+            # Closed rings start and end on the same vertex
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(dx * inner[:, 1] - dy * inner[:, 0]) / length
+        index = int(distances.argmax())
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return points[keep]
+
+
+def simplify_ring(vertices, tolerance):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    ring = douglas_peucker(np.vstack([vertices, vertices[:1]]), tolerance)[:-1]
+    # Rings smaller than the tolerance keep their shape rather than collapsing
+    return ring if len(ring) >= 3 else vertices
+
+
+class LevelOfDetail:
+    # Simplifies polygons to the output resolution before they are rendered.
+    # The tolerance is in output pixels; the size of a pixel in data units is
+    # rounded down to a power of two, the zoom level, so slightly different
+    # views share one simplification. Results are cached per shape and zoom
+    # level and reused as long as the shape's vertices are the same object.
+
+    def __init__(self, tolerance=0.5, pixels=None, min_vertices=64):
+        self.tolerance = tolerance
+        if pixels is None:
+            width, height = matplotlib.rcParams['figure.figsize']
+            dpi = matplotlib.rcParams['figure.dpi']
+            pixels = (width * dpi, height * dpi)
+        self.pixels = pixels
+        self.min_vertices = min_vertices
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def zoom_level(self, vertices, units_per_pixel=None):
+        if units_per_pixel is None:
+            # Shapes drawn on their own fill the figure
+            extent = np.ptp(vertices, axis=0).max()
+            units_per_pixel = extent / max(self.pixels)
+        if units_per_pixel <= 0:
+            return None
+        return math.floor(math.log2(units_per_pixel))
+
+    def simplify(self, name, vertices, units_per_pixel=None):
+        if len(vertices) < self.min_vertices:
+            return vertices
+        level = self.zoom_level(np.asarray(vertices), units_per_pixel)
+        if level is None:
+            return vertices
+        key = (name, level)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] is vertices:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        simplified = simplify_ring(vertices, self.tolerance * 2.0 ** level)
+        self.cache[key] = (vertices, simplified)
+        return simplified
+
+    def simplify_shape(self, name, shape, units_per_pixel=None):
+        if shape['type'] != 'polygon':
+            # Triangles, circles and rectangles are already minimal
+            return shape
+        vertices = self.simplify(name, shape['vertices'], units_per_pixel)
+        if vertices is shape['vertices']:
+            return shape
+        return {'type': 'polygon', 'vertices': vertices}
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,236 @@
+import bisect
+import glob
+import json
+import os
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide counters and latency histograms, exported in the Prometheus
+# text format. Updating a metric only touches memory. When the
+# CDSL_METRICS_DIR environment variable names a directory, every process
+# writes its values there as one JSON file after each script, and reading
+# the directory adds up all processes, pool workers included.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        # Label values tuple -> count
+        self.values = {}
+
+    def inc(self, amount=1, label_values=()):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, total, values):
+        for key, value in values:
+            key = tuple(key)
+            total[key] = total.get(key, 0) + value
+
+    def render(self, values):
+        if not self.labels and not values:
+            return [f"{self.name} 0"]
+        lines = []
+        for key, value in sorted(values.items()):
+            labels = ','.join(f'{name}="{label}"' for name, label in zip(self.labels, key))
+            lines.append(f"{self.name}{{{labels}}} {value:g}" if labels else f"{self.name} {value:g}")
+        return lines
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        # One count per bucket plus one for values above the last bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return {'counts': list(self.counts), 'sum': self.sum}
+
+    def merge(self, total, values):
+        counts = total.setdefault('counts', [0] * (len(self.buckets) + 1))
+        for index, count in enumerate(values['counts']):
+            counts[index] += count
+        total['sum'] = total.get('sum', 0.0) + values['sum']
+
+    def render(self, values):
+        counts = values.get('counts', [0] * (len(self.buckets) + 1))
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {values.get('sum', 0.0):g}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        self.metrics = {}
+        self.directory = directory
+        # Names this process's file; a forked child gets a new one
+        self.token = uuid.uuid4().hex
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, buckets))
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+        self.token = uuid.uuid4().hex
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        # Writes this process's values to the metrics directory, if any
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, f"metrics-{self.token}.json")
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, 'w') as f:
+                json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, f)
+            os.replace(temporary, path)
+        except OSError as e:
+            print(f"Error: Could not write metrics to {path}: {e}")
+
+    def collect(self, directory=None):
+        # Totals over every process file in the directory, with this
+        # process's live values in place of its own file
+        directory = directory or self.directory
+        snapshots = [self.snapshot()]
+        if directory is not None:
+            own = f"metrics-{self.token}.json"
+            for path in sorted(glob.glob(os.path.join(directory, 'metrics-*.json'))):
+                if os.path.basename(path) == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f)['metrics'])
+                except (OSError, ValueError, KeyError):
+                    # A file being replaced is picked up on the next read
+                    continue
+        totals = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    metric.merge(totals[name], values)
+        return totals
+
+    def render(self, directory=None):
+        totals = self.collect(directory)
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(totals[name]))
+        return '\n'.join(lines) + '\n'
+
+    def write_text(self, path, directory=None):
+        # A .prom file for a textfile collector, replaced atomically
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(self.render(directory))
+        os.replace(temporary, path)
+
+    def serve(self, port=9100, host='', directory=None):
+        # Serves the aggregated metrics on /metrics from a daemon thread and
+        # returns the server; call shutdown() on it to stop
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render(directory).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+registry = MetricsRegistry(os.environ.get('CDSL_METRICS_DIR'))
+# Forked pool workers start from zero instead of counting the parent's
+# values a second time
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+SCRIPTS = registry.counter('cdsl_scripts_total', 'Scripts run, by final status', ('status',))
+STATEMENTS = registry.counter('cdsl_statements_executed_total', 'Statements executed')
+SHAPES_CREATED = registry.counter('cdsl_shapes_created_total', 'Shapes created, family members included')
+SHAPES_DRAWN = registry.counter('cdsl_shapes_drawn_total', 'Shapes drawn')
+SHAPES_CULLED = registry.counter('cdsl_shapes_culled_total', 'Draws skipped for lying outside the viewport')
+SYNTAX_ERRORS = registry.counter('cdsl_syntax_errors_total', 'Syntax errors reported by the parser')
+BUDGET_VIOLATIONS = registry.counter('cdsl_budget_violations_total', 'Runs stopped by their execution budget, by limit', ('limit',))
+MODULE_LOADS = registry.counter('cdsl_module_loads_total', 'Module imports, by the cache level that answered them', ('source',))
+PARSE_SECONDS = registry.histogram('cdsl_parse_seconds', 'Time to parse a script and build its syntax tree')
+EXECUTE_SECONDS = registry.histogram('cdsl_execute_seconds', 'Time to run a script, including draws rendered inline')
+RENDER_SECONDS = registry.histogram('cdsl_render_seconds', 'Time to render one draw')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python Metrics.py METRICS_DIR [PORT]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        server = registry.serve(int(sys.argv[2]), directory=sys.argv[1])
+        print(f"Serving metrics from {sys.argv[1]} on port {sys.argv[2]}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        print(registry.render(sys.argv[1]), end='')
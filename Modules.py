@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import threading
+from antlr4 import InputStream, CommonTokenStream
+from DrawShapesLexer import DrawShapesLexer
+from DrawShapesParser import DrawShapesParser
+from Resolver import Resolver, Scope
+from SyntaxTree import FunctionDefinition, ImportStmt, Shape, build_program, walk, tree_to_data, tree_from_data
+from Metrics import MODULE_LOADS
+
+# Compiled modules are cached as JSON syntax trees, which can only ever be
+# read back as tree nodes. Cache files written by an older tree layout must
+# not be read.
+CACHE_VERSION = 2
+CACHE_DIR = '.dslcache'
+
+
+class ModuleError(Exception):
+    pass
+
+
+class Module:
+    # The functions a library file provides, its own and those of the modules
+    # it imports, resolved and ready to register
+    def __init__(self, path, digest, functions, shape_names, dependencies, definitions=()):
+        self.path = path
+        # Hash of the file's content
+        self.digest = digest
+        self.functions = functions
+        # The functions defined in the file itself, in source order
+        self.definitions = definitions
+        # Shapes the functions create, which scripts may refer to by name
+        self.shape_names = shape_names
+        # Absolute path -> version of every module imported directly
+        self.dependencies = dependencies
+        # Hash of the content and the versions of all imports, so it changes
+        # whenever any module this one depends on, however indirectly, changes
+        self.version = hashlib.sha256((digest + ''.join(dependencies.values())).encode()).hexdigest()
+        # (mtime, size) of the file when it was last checked
+        self.stat = None
+
+
+class ModuleLoader:
+    # Loads modules for import statements. A module is looked up by path in
+    # memory, where an unchanged file costs one os.stat, then by content hash
+    # in the .dslcache directory next to it, and only compiled when both
+    # miss. Either cached version is discarded when a module it imports
+    # changed. Relative paths are taken from the importing module's
+    # directory, or from base_dir (the working directory by default) for
+    # scripts.
+
+    def __init__(self, base_dir=None, cache_dir=None, disk_cache=True):
+        self.base_dir = base_dir
+        # One shared cache directory instead of one next to every module
+        self.cache_dir = cache_dir
+        self.disk_cache = disk_cache
+        self.modules = {}
+        self.loading = []
+        self.lock = threading.RLock()
+        self.stats = {'memory': 0, 'disk': 0, 'compiled': 0}
+
+    def resolve_path(self, path, importer=None):
+        if importer is not None:
+            base = os.path.dirname(importer)
+        else:
+            base = self.base_dir or os.getcwd()
+        return os.path.normpath(os.path.join(base, path))
+
+    def load(self, path, importer=None):
+        path = self.resolve_path(path, importer)
+        with self.lock:
+            if path in self.loading:
+                raise ModuleError(f"Circular import of {path}")
+            self.loading.append(path)
+            try:
+                return self.load_module(path)
+            finally:
+                self.loading.pop()
+
+    def load_module(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            raise ModuleError(f"Cannot import {path}: {e.strerror}")
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        module = self.modules.get(path)
+        if module is not None and module.stat == stat_key and self.dependencies_current(module):
+            self.stats['memory'] += 1
+            MODULE_LOADS.inc(1, ('memory',))
+            return module
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            raise ModuleError(f"Cannot import {path}: {e.strerror}")
+        digest = hashlib.sha256(data).hexdigest()
+        if module is None or module.digest != digest or not self.dependencies_current(module):
+            module = self.read_cache(path, digest)
+            if module is None:
+                try:
+                    source = data.decode('utf-8')
+                except UnicodeDecodeError as e:
+                    raise ModuleError(f"Cannot import {path}: not UTF-8 text ({e.reason} at byte {e.start})")
+                module = self.compile(path, digest, source)
+                self.write_cache(module)
+        module.stat = stat_key
+        self.modules[path] = module
+        return module
+
+    def dependencies_current(self, module):
+        for path, version in module.dependencies.items():
+            if self.load(path).version != version:
+                return False
+        return True
+
+    def compile(self, path, digest, source):
+        # main imports the interpreter, which imports this module
+        from main import DSLErrorListener, parse_lock
+
+        lexer = DrawShapesLexer(InputStream(source))
+        error_listener = DSLErrorListener()
+        lexer.removeErrorListeners()
+        lexer.addErrorListener(error_listener)
+        parser = DrawShapesParser(CommonTokenStream(lexer))
+        parser.removeErrorListeners()
+        parser.addErrorListener(error_listener)
+        with parse_lock:
+            tree = parser.program()
+        if error_listener.has_error:
+            raise ModuleError(f"Syntax errors in {path}")
+        program = build_program(tree)
+
+        functions = {}
+        shape_names = set()
+        dependencies = {}
+        for stmt in program.statements:
+            if isinstance(stmt, ImportStmt):
+                dependency = self.load(stmt.path, importer=path)
+                dependencies[dependency.path] = dependency.version
+                functions.update(dependency.functions)
+                shape_names |= dependency.shape_names
+            elif not isinstance(stmt, FunctionDefinition):
+                raise ModuleError(f"{path} may only contain function definitions and imports")
+
+        errors = Resolver(shape_names).resolve_program(program, Scope())
+        if errors:
+            raise ModuleError(f"Unresolved variables in {path}:\n" + "\n".join(errors))
+        shape_names |= {node.name for node in walk(program) if isinstance(node, Shape)}
+        definitions = tuple(stmt for stmt in program.statements if isinstance(stmt, FunctionDefinition))
+        functions.update((definition.name, definition) for definition in definitions)
+        self.stats['compiled'] += 1
+        MODULE_LOADS.inc(1, ('compiled',))
+        return Module(path, digest, functions, shape_names, dependencies, definitions)
+
+    def cache_path(self, path, digest):
+        directory = self.cache_dir or os.path.join(os.path.dirname(path), CACHE_DIR)
+        return os.path.join(directory, f"{digest}.json")
+
+    def read_cache(self, path, digest):
+        if not self.disk_cache:
+            return None
+        try:
+            with open(self.cache_path(path, digest), 'rb') as f:
+                data = json.load(f)
+            if data['version'] != CACHE_VERSION or data['digest'] != digest:
+                return None
+            definitions = tree_from_data(data['definitions'])
+            shape_names = set(data['shape_names'])
+            dependencies = dict(data['dependencies'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        # Functions of the imported modules come from those modules, which
+        # must still be the versions this entry was compiled against
+        functions = {}
+        for dependency_path, version in dependencies.items():
+            dependency = self.load(dependency_path)
+            if dependency.version != version:
+                return None
+            functions.update(dependency.functions)
+        functions.update((definition.name, definition) for definition in definitions)
+        self.stats['disk'] += 1
+        MODULE_LOADS.inc(1, ('disk',))
+        # Files with the same content share an entry, the path is the caller's
+        return Module(path, digest, functions, shape_names, dependencies, definitions)
+
+    def write_cache(self, module):
+        if not self.disk_cache:
+            return
+        cache_path = self.cache_path(module.path, module.digest)
+        # Written under a temporary name first, so processes sharing the
+        # cache never read a partial file
+        temporary = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            data = {
+                'version': CACHE_VERSION,
+                'digest': module.digest,
+                'definitions': tree_to_data(module.definitions),
+                'shape_names': sorted(module.shape_names),
+                'dependencies': module.dependencies
+            }
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(temporary, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temporary, cache_path)
+        except (OSError, ValueError):
+            # The cache is optional, a read-only directory or a tree that
+            # cannot be stored only costs speed
+            pass
+
+
+# Shared by every interpreter in the process, so repeated runs importing
+# the same library only check that its files did not change
+default_loader = ModuleLoader()
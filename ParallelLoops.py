@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor
+from Builtins import BUILTIN_FUNCTIONS
+from ExecutionBudget import ExecutionBudget, BudgetExceededError
+from SyntaxTree import (FunctionCall, Shape, Transformation, AddFeatureTransform, Conditional,
+                        ForLoop, walk)
+
+_pool = None
+_pool_workers = None
+
+
+def calls_only_builtins(node):
+    for child in walk(node):
+        if isinstance(child, FunctionCall) and child.name not in BUILTIN_FUNCTIONS:
+            return False
+    return True
+
+
+def block_is_independent(statements, created):
+    # A block is independent when it never writes variables, prints, calls
+    # user functions or transforms a shape it did not create itself. created
+    # collects the shapes that are certainly created by the block.
+    for node in statements:
+        if isinstance(node, Shape):
+            if not calls_only_builtins(node):
+                return False
+            created.add(node.name)
+        elif isinstance(node, Transformation):
+            if isinstance(node, AddFeatureTransform):
+                return False
+            if node.name not in created or not calls_only_builtins(node):
+                return False
+        elif isinstance(node, Conditional):
+            branches = list(node.branches)
+            if node.else_body is not None:
+                branches.append((None, node.else_body))
+            branch_created = []
+            for condition, body in branches:
+                if condition is not None and not calls_only_builtins(condition):
+                    return False
+                created_here = set(created)
+                if not block_is_independent(body, created_here):
+                    return False
+                branch_created.append(created_here)
+            if node.else_body is None:
+                branch_created.append(set(created))
+            # Only shapes created on every path count as created afterwards
+            created.update(set.intersection(*branch_created))
+        elif isinstance(node, ForLoop):
+            if not all(calls_only_builtins(bound) for bound in (node.start, node.end) if bound is not None):
+                return False
+            if not block_is_independent(node.body, set(created)):
+                return False
+        else:
+            return False
+    return True
+
+
+def loop_is_parallel_safe(node):
+    return block_is_independent(node.body, set())
+
+
+def get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def run_chunk(loop, frame, start, end, limits):
+    from ShapeDrawer import ShapeDrawer
+
+    # The chunk runs under what is left of the parent's budget and counts
+    # its steps for it; without limits the budget only counts
+    budget = ExecutionBudget() if limits is None else ExecutionBudget.from_limits(limits)
+    drawer = ShapeDrawer(budget=budget, parallel=False)
+    budget.check()
+    drawer.recorded_draws = []
+    # The loop arrives resolved against the parent's scope, so a copy of the
+    # parent's frame is all the state it needs
+    drawer.frame = frame
+
+    for i in range(start, end):
+        drawer.tick()
+        drawer.frame[loop.slot] = i
+        for stmt in loop.body:
+            drawer.execute(stmt)
+    return drawer.shapes, drawer.families, drawer.recorded_draws, drawer.budget.steps, drawer.statement_count
+
+
+def merged_results(budget, results):
+    # A chunk stopped by its budget stops the loop with the parent's limit,
+    # counting the steps the chunk took; chunks not started yet are cancelled
+    try:
+        yield from results
+    except BudgetExceededError as e:
+        budget.steps += e.stats['steps']
+        budget.exceeded(e.kind, budget.limit(e.kind))
+
+
+def run_parallel_loop(drawer, loop, start_val, end_val):
+    workers = drawer.workers
+    iterations = end_val - start_val
+    chunk_count = min(workers * 4, iterations)
+    bounds = [start_val + iterations * k // chunk_count for k in range(chunk_count + 1)]
+
+    frame = list(drawer.frame)
+    budget = drawer.budget
+    limits = None if budget is None else budget.chunk_limits()
+    pool = get_pool(workers)
+    results = pool.map(run_chunk, [loop] * chunk_count, [frame] * chunk_count, bounds[:-1], bounds[1:],
+                       [limits] * chunk_count)
+
+    # Chunks are merged in iteration order, so later iterations win exactly
+    # as they would when running serially
+    for shapes, families, draws, steps, statements in merged_results(budget, results):
+        for name, shape in shapes.items():
+            drawer.store_shape(name, shape)
+        drawer.families.update(families)
+        drawer.statement_count += statements
+        # Chunks never add features, the draws show what the parent has
+        for name, shape, _ in draws:
+            drawer.draw_shape(name, shape)
+        if drawer.budget is not None:
+            drawer.budget.steps += steps
+            drawer.budget.check()
@@ -0,0 +1,136 @@
+import os
+import gc
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from main import parse_and_run
+from Snapshot import KIND_CODES, shape_coordinates, unpack_shape_list
+from ShapeDrawer import ShapeDrawer
+import Metrics
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def scene_arrays(buffer, count, coord_count):
+    # Kind codes, offsets and coordinates laid out one after another in
+    # buffer, as views that share its memory
+    kinds = np.ndarray(count, dtype=np.uint8, buffer=buffer)
+    position = _align(count)
+    offsets = np.ndarray(count + 1, dtype=np.int64, buffer=buffer, offset=position)
+    position += offsets.nbytes
+    coords = np.ndarray(coord_count, dtype=np.float64, buffer=buffer, offset=position)
+    return kinds, offsets, coords
+
+
+def scene_size(count, coord_count):
+    return _align(count) + 8 * (count + 1) + 8 * coord_count
+
+
+class SharedScene:
+    # The draws of one interpreted script, published in a shared memory
+    # block. Render workers attach to the block by name and read the
+    # geometry in place; only the descriptor is pickled.
+
+    def __init__(self, draws):
+        parts = [shape_coordinates(shape) for _, shape, _ in draws]
+        sizes = [len(part) for part in parts]
+        coord_count = sum(sizes)
+        # A zero-sized block cannot be created
+        self.memory = SharedMemory(create=True, size=max(scene_size(len(draws), coord_count), 8))
+        kinds, offsets, coords = scene_arrays(self.memory.buf, len(draws), coord_count)
+        kinds[:] = [KIND_CODES[shape['type']] for _, shape, _ in draws]
+        offsets[0] = 0
+        np.cumsum(sizes, out=offsets[1:])
+        # Each shape's coordinates are written straight into the block
+        for part, start in zip(parts, offsets.tolist()):
+            coords[start:start + len(part)] = part
+        del kinds, offsets, coords
+        self.descriptor = {
+            'memory': self.memory.name,
+            'names': [name for name, _, _ in draws],
+            'coord_count': coord_count,
+            # Features per draw, only for the draws that show any
+            'annotations': {index: annotations for index, (_, _, annotations) in enumerate(draws) if annotations}
+        }
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+def render_shared_scene(descriptor, directory, lod=None, viewport=None):
+    # Runs in a render worker: draws the published shapes in their original
+    # order and saves the figures, returning their paths
+    memory = SharedMemory(name=descriptor['memory'])
+    try:
+        names = descriptor['names']
+        shapes = unpack_shape_list(*scene_arrays(memory.buf, len(names), descriptor['coord_count']))
+        drawer = ShapeDrawer(show=False, parallel=False, lod=lod, viewport=viewport)
+        annotations = descriptor['annotations']
+        for index, (name, shape) in enumerate(zip(names, shapes)):
+            drawer.annotations[name] = annotations.get(index, ())
+            drawer.draw_shape(name, shape)
+        paths = drawer.save_figures(directory)
+        Metrics.SHAPES_DRAWN.inc(drawer.render_stats['drawn'])
+        Metrics.SHAPES_CULLED.inc(drawer.render_stats['culled'])
+        # Views into the block must be gone before it can be closed
+        del drawer, shapes
+        gc.collect()
+        return paths
+    finally:
+        memory.close()
+        Metrics.registry.flush()
+
+
+def run_pipeline(scripts, output_dir, workers=None, max_pending=None, lod=None, viewport=None, **options):
+    # Interprets the scripts one after another in this process while a pool
+    # of render processes draws the scripts already interpreted, so
+    # interpreting script N + 1 overlaps with rendering script N. At most
+    # max_pending scenes wait in shared memory at once. Each script's figures
+    # go to their own numbered directory; returns the paths per script.
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    directories = [os.path.join(output_dir, f"script_{index:03d}") for index in range(len(scripts))]
+    results = [[] for _ in scripts]
+    pending = deque()
+
+    def collect():
+        index, scene, job = pending.popleft()
+        try:
+            results[index] = job.result()
+        finally:
+            scene.release()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for index, script in enumerate(scripts):
+                drawer = parse_and_run(script, show=False, record_draws=True, **options)
+                if drawer is None:
+                    continue
+                scene = SharedScene(drawer.recorded_draws)
+                pending.append((index, scene, pool.submit(render_shared_scene, scene.descriptor, directories[index], lod, viewport)))
+                while len(pending) >= max_pending:
+                    collect()
+            while pending:
+                collect()
+        finally:
+            for _, scene, job in pending:
+                job.cancel()
+                scene.release()
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python Pipeline.py OUTPUT_DIR SCRIPT...")
+        sys.exit(1)
+    sources = []
+    for path in sys.argv[2:]:
+        with open(path) as f:
+            sources.append(f.read())
+    for path, paths in zip(sys.argv[2:], run_pipeline(sources, sys.argv[1])):
+        print(f"{path}: {len(paths)} figures")
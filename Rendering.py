@@ -0,0 +1,26 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from main import parse_and_run
+
+
+def render_script(script, directory, **options):
+    # One render job: the drawer owns its figures, so nothing is shared with
+    # other jobs apart from imported modules and matplotlib's font caches
+    drawer = parse_and_run(script, show=False, **options)
+    if drawer is None:
+        return []
+    paths = drawer.save_figures(directory)
+    drawer.figures.clear()
+    return paths
+
+
+def render_many(scripts, output_dir, workers=4, **options):
+    # Renders several scripts at once on a thread pool. Each script's figures
+    # go to their own numbered directory; returns the paths per script.
+    # Loops run serially by default since every job would otherwise share
+    # one process pool.
+    options.setdefault('parallel', False)
+    directories = [os.path.join(output_dir, f"script_{index:03d}") for index in range(len(scripts))]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(render_script, script, directory, **options) for script, directory in zip(scripts, directories)]
+        return [job.result() for job in jobs]
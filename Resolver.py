@@ -0,0 +1,93 @@
+from SyntaxTree import Name, Assignment, ForLoop, FunctionDefinition, Shape, iter_children, walk
+
+
+class Scope:
+    def __init__(self, names=()):
+        self.names = []
+        self.slots = {}
+        for name in names:
+            self.declare(name)
+
+    def declare(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+
+class Resolver:
+    # Maps every variable reference to a numbered slot in its scope before the
+    # program runs. The program's top level shares one scope, each function
+    # gets its own. Parameters and every name assigned or used as a loop
+    # variable anywhere in a scope are declared before it is resolved, so a
+    # loop body may read a name it only assigns further down; such a read
+    # sees 0 on the first pass. Reading a name assigned nowhere in the scope
+    # is reported as an error unless it names a shape.
+    #
+    # Resolved nodes carry the slot: assignments, for loops, parameters and
+    # names get .slot (None for names of shapes) and function definitions get
+    # .scope_names.
+
+    def __init__(self, shape_names=()):
+        self.shape_names = set(shape_names)
+        self.errors = []
+
+    def resolve_program(self, program, scope):
+        self.collect_shape_names(program)
+        self.declare_assigned(program.statements, scope)
+        self.resolve(program, scope)
+        return self.errors
+
+    def collect_shape_names(self, program):
+        for node in walk(program):
+            if isinstance(node, Shape):
+                self.shape_names.add(node.name)
+
+    def declare_assigned(self, statements, scope):
+        # Nested function definitions have scopes of their own
+        stack = list(reversed(statements))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, FunctionDefinition):
+                continue
+            if isinstance(node, (Assignment, ForLoop)):
+                scope.declare(node.name)
+            stack.extend(reversed(list(iter_children(node))))
+
+    def resolve(self, node, scope):
+        if isinstance(node, Name):
+            node.slot = scope.slots.get(node.name)
+            if node.slot is None and node.name not in self.shape_names:
+                self.errors.append(f"Error at line {node.line}:{node.column} - Unknown variable '{node.name}'")
+            return
+        elif isinstance(node, Assignment):
+            self.resolve(node.value, scope)
+            node.slot = scope.declare(node.name)
+            return
+        elif isinstance(node, ForLoop):
+            for bound in (node.start, node.end):
+                if bound is not None:
+                    self.resolve(bound, scope)
+            node.slot = scope.declare(node.name)
+            for stmt in node.body:
+                self.resolve(stmt, scope)
+            return
+        elif isinstance(node, FunctionDefinition):
+            self.resolve_function(node)
+            return
+
+        for child in iter_children(node):
+            self.resolve(child, scope)
+
+    def resolve_function(self, function):
+        # Functions only see their own parameters and locals
+        scope = Scope()
+        for param in function.params:
+            param.slot = scope.declare(param.name)
+        self.declare_assigned(function.body, scope)
+        for stmt in function.body:
+            self.resolve(stmt, scope)
+        self.resolve(function.ret, scope)
+        function.scope_names = scope.names
+        return self.errors
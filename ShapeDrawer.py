@@ -1,370 +1,538 @@
-from antlr4 import *
-from DrawShapesLexer import DrawShapesLexer
-from DrawShapesParser import DrawShapesParser
-from DrawShapesVisitor import DrawShapesVisitor
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
 import numpy as np
 import math
+import os
+import re
+import time
+from itertools import chain
+from Geometry import FEATURE_TYPES, all_feature_segments, closest_vertex_indices, feature_segments
+from GeometryLoader import load_vertices
+from Animation import shape_extent, shape_patch
+from ParallelLoops import loop_is_parallel_safe, run_parallel_loop
+from Resolver import Resolver, Scope
+from Builtins import BUILTIN_FUNCTIONS
+from Intersections import find_overlaps
+from Modules import ModuleError, default_loader
+from SyntaxTree import ImportStmt, walk
+from Metrics import RENDER_SECONDS
 
-class ShapeDrawer(DrawShapesVisitor):
-    def __init__(self):
+class ShapeDrawer:
+    def __init__(self, budget=None, animation=None, parallel=True, workers=None, parallel_min_iterations=2000, lod=None, viewport=None, show=True, accounting=None, modules=None):
+        # Variables live in self.frame, indexed by the slots the Resolver
+        # assigned; self.scope_names holds the names of the current scope
         self.variables = {}
         self.functions = {}
         self.shapes = {}
+        # Member names of shape families created from array arguments
+        self.families = {}
+        # Pairs found by the last overlaps statement
+        self.overlaps = []
+        # Geometric features per shape name as tuples of (feature_type,
+        # vertex_index) pairs, drawn on the shape's canvas
+        self.annotations = {}
+        # Features added in bulk, per (family, feature_type) with family None
+        # for all triangles: a name -> row dict and an (n, k) array of the
+        # vertex each feature starts at
+        self.family_features = {}
+        # Axes each shape was last drawn on
+        self.canvases = {}
         self.currentFunctionReturn = None
         self.returnFlag = False
+        # Optional ExecutionBudget limiting steps, time, shapes, memory and call depth
+        self.budget = budget
+        if budget is not None:
+            budget.start()
+        # Optional Animation turning every draw into a frame on one canvas
+        self.animation = animation
+        # Long for loops whose iterations are independent run on a process
+        # pool unless parallel is False
+        self.parallel = parallel
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_min_iterations = parallel_min_iterations
+        self.parallel_safe = {}
+        # Optional LevelOfDetail simplifying polygons before they are rendered
+        self.lod = lod
+        # Optional Viewport; draws of shapes outside it are skipped
+        self.viewport = viewport
+        # name -> (shape, bounds), valid while the shape dict is unchanged
+        self.bounds_cache = {}
+        self.render_stats = {'drawn': 0, 'culled': 0}
+        # With show False figures are rendered on Agg canvases collected in
+        # self.figures instead of pyplot windows
+        self.show = show
+        self.figures = []
+        self.figure_count = 0
+        # Optional ResourceAccount charging transforms and draws to their phase
+        self.accounting = accounting
+        # ModuleLoader for import statements, shared by default so modules
+        # stay cached between runs
+        self.modules = modules or default_loader
+        # Draws are collected here instead of rendered when set to a list,
+        # as (name, shape, annotations) with the features shown by the draw
+        self.recorded_draws = None
+        # name -> index of the shape's latest recorded draw
+        self.last_recorded = {}
+        # 'import_error' or 'resolve_error' when resolve() stopped the program
+        # before it ran
+        self.resolve_status = None
+        # Totals for the metrics, kept as plain ints on the hot path
+        self.statement_count = 0
+        self.shapes_created = 0
 
-    def visitProgram(self, ctx):
-        for stmt in ctx.statement():
-            self.visit(stmt)
+    @property
+    def variables(self):
+        return dict(zip(self.scope_names, self.frame))
+
+    @variables.setter
+    def variables(self, values):
+        self.global_scope = Scope(values)
+        self.scope_names = self.global_scope.names
+        self.frame = list(values.values())
+
+    def resolve(self, program):
+        # Modules are loaded up front: shapes their functions create count as
+        # known names for the rest of the program
+        self.resolve_status = None
+        shape_names = set(self.shapes)
+        import_errors = []
+        for node in walk(program):
+            if isinstance(node, ImportStmt):
+                try:
+                    node.module = self.modules.load(node.path)
+                    shape_names |= node.module.shape_names
+                except ModuleError as e:
+                    import_errors.append(f"Error: {e}")
+        for error in import_errors:
+            print(error)
+        if import_errors:
+            print("Execution stopped due to import errors.")
+            self.resolve_status = 'import_error'
+            return False
+        errors = Resolver(shape_names).resolve_program(program, self.global_scope)
+        # Globals declared by this program start out as 0
+        self.frame.extend([0] * (len(self.global_scope.names) - len(self.frame)))
+        for error in errors:
+            print(error)
+        if errors:
+            print("Execution stopped due to unresolved variables.")
+            self.resolve_status = 'resolve_error'
+        return not errors
+
+    def tick(self):
+        # Counts one interpreter step; the expensive checks only run every
+        # budget.check_interval steps
+        budget = self.budget
+        if budget is not None:
+            budget.steps += 1
+            if budget.steps >= budget.next_check:
+                budget.check()
+
+    def store_shape(self, name, shape):
+        self.shapes[name] = shape
+        self.shapes_created += 1
+        self.annotations.pop(name, None)
+        for rows, _ in self.family_features.values():
+            rows.pop(name, None)
+        if self.budget is not None:
+            self.budget.check_shapes(len(self.shapes))
+
+    def family_rows(self, name, values):
+        # Broadcasts the scalar and array arguments of a shape statement into
+        # one row of arguments per family member, None without any arrays and
+        # no rows when the arrays differ in length
+        if not any(isinstance(value, np.ndarray) for value in values):
+            return None
+        try:
+            columns = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in values])
+        except ValueError:
+            lengths = sorted({len(value) for value in values if isinstance(value, np.ndarray)})
+            print(f"Error: Arrays of lengths {', '.join(map(str, lengths))} used together in {name}")
+            return []
+        return np.column_stack([column.ravel() for column in columns]).tolist()
+
+    def store_family(self, name, shapes, draw):
+        # Members are stored as name_0, name_1, ... and replace any earlier
+        # family of that name. A statement whose arrays did not match leaves
+        # the shapes as they were.
+        if not shapes:
+            return
+        members = [f"{name}_{index}" for index in range(len(shapes))]
+        for stale in self.families.get(name, ())[len(members):]:
+            self.shapes.pop(stale, None)
+        self.families[name] = members
+        for member, shape in zip(members, shapes):
+            self.store_shape(member, shape)
+        if draw:
+            for member in members:
+                self.draw_shape(member, self.shapes[member])
+
+    def transform_targets(self, shape_name, point=None):
+        # (shape name, point) pairs a transformation applies to: the shape of
+        # that name, or every member of the family. Array coordinates in the
+        # point give each member its own value.
+        if shape_name in self.shapes:
+            if point is not None and any(isinstance(value, np.ndarray) for value in point):
+                print(f"Error: Array point used with single shape {shape_name}")
+                return []
+            return [(shape_name, point)]
+        members = self.families.get(shape_name, [])
+        if point is None:
+            return [(member, None) for member in members]
+        try:
+            xs, ys, _ = np.broadcast_arrays(np.asarray(point[0], dtype=np.float64), np.asarray(point[1], dtype=np.float64), np.zeros(len(members)))
+        except ValueError:
+            print(f"Error: Point does not match the {len(members)} shapes of family {shape_name}")
+            return []
+        return list(zip(members, zip(xs.tolist(), ys.tolist())))
+
+    def visit(self, node):
+        return node.accept(self)
+
+    def execute(self, stmt):
+        self.statement_count += 1
+        self.tick()
+        return stmt.accept(self)
+
+    def visitProgram(self, program):
+        if not self.resolve(program):
+            return None
+        for stmt in program.statements:
+            self.execute(stmt)
         return None
 
-    def visitAssignment(self, ctx):
-        var_name = ctx.ID().getText()
-        if ctx.STRING():
-            var_value = ctx.STRING().getText().strip('"')
-        else:
-            var_value = self.visit(ctx.expression())
-        self.variables[var_name] = var_value
+    def visitAssignment(self, node):
+        self.frame[node.slot] = self.visit(node.value)
         return None
 
-    def visitConditional(self, ctx):
-        condition_result = self.visit(ctx.condition())
-        if condition_result:
-            for stmt in ctx.statement():
-                self.visit(stmt)
-                if self.returnFlag:
-                    return self.currentFunctionReturn
-            return None
-        
-        if ctx.elseIfPart():
-            for else_if_part in ctx.elseIfPart():
-                else_if_condition_result = self.visit(else_if_part.condition())
-                if else_if_condition_result:
-                    for stmt in else_if_part.statement():
-                        self.visit(stmt)
-                        if self.returnFlag:
-                            return self.currentFunctionReturn
-                    return None
-        
-        if ctx.elsePart():
-            for stmt in ctx.elsePart().statement():
-                self.visit(stmt)
-                if self.returnFlag:
-                    return self.currentFunctionReturn
+    def visitConditional(self, node):
+        for condition, body in node.branches:
+            if self.visit(condition):
+                break
+        else:
+            body = node.else_body or ()
         
+        for stmt in body:
+            self.execute(stmt)
+            if self.returnFlag:
+                return self.currentFunctionReturn
         return None
 
-    def visitCondition(self, ctx):
-        left = self.visit(ctx.expression(0))
-        right = self.visit(ctx.expression(1))
-        comp = ctx.comparison().getText()
+    def visitCondition(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
         
         if isinstance(left, str) and left.isdigit():
             left = float(left)
         if isinstance(right, str) and right.isdigit():
             right = float(right)
-            
-        if comp == '==':
-            return left == right
-        elif comp == '<':
-            return left < right
-        elif comp == '>':
-            return left > right
-        elif comp == '<=':
-            return left <= right
-        elif comp == '>=':
-            return left >= right
-        elif comp == '!=':
-            return left != right
-        
-        return False
-
-    def visitForLoop(self, ctx):
-        loop_var = ctx.ID().getText()
-        
-        # Handle both simple 'for i in 5' and 'for i in range(1, 10)' syntax
-        if ctx.INT():
-            # Simple 'for i in 5' syntax
-            repeat_count = int(ctx.INT().getText())
-            start_val = 0
-            end_val = repeat_count
-        else:
-            # 'for i in range(x, y)' syntax
-            if len(ctx.expression()) == 1:
-                start_val = 0
-                end_val = int(self.visit(ctx.expression(0)))
-            else:
-                start_val = int(self.visit(ctx.expression(0)))
-                end_val = int(self.visit(ctx.expression(1)))
         
-        original_value = self.variables.get(loop_var, None)
+        try:
+            result = node.compare(left, right)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return False
+        # Array comparisons hold when they hold for every element
+        if isinstance(result, np.ndarray):
+            return bool(result.all())
+        return result
+
+    def visitForLoop(self, node):
+        loop_slot = node.slot
+        
+        # 'for i in 5', 'for i in range(y)' and 'for i in range(x, y)' all
+        # count up from start, which defaults to 0
+        start_val = int(self.visit(node.start)) if node.start is not None else 0
+        end_val = int(self.visit(node.end))
+        
+        if self.parallel and self.workers > 1 and end_val - start_val >= self.parallel_min_iterations:
+            safe = self.parallel_safe.get(node)
+            if safe is None:
+                safe = self.parallel_safe[node] = loop_is_parallel_safe(node)
+            if safe:
+                run_parallel_loop(self, node, start_val, end_val)
+                return None
+        
+        original_value = self.frame[loop_slot]
         
         for i in range(start_val, end_val):
-            self.variables[loop_var] = i
-            for stmt in ctx.statement():
-                self.visit(stmt)
+            self.tick()
+            self.frame[loop_slot] = i
+            for stmt in node.body:
+                self.execute(stmt)
                 if self.returnFlag:
-                    # Restore original variable value if it existed
-                    if original_value is not None:
-                        self.variables[loop_var] = original_value
-                    else:
-                        del self.variables[loop_var]
+                    # Restore original variable value
+                    self.frame[loop_slot] = original_value
                     return self.currentFunctionReturn
         
-        # Restore original variable value if it existed
-        if original_value is not None:
-            self.variables[loop_var] = original_value
-        else:
-            del self.variables[loop_var]
+        # Restore original variable value
+        self.frame[loop_slot] = original_value
         
         return None
 
-    def visitWhileLoop(self, ctx):
-        while self.visit(ctx.condition()):
-            for stmt in ctx.statement():
-                self.visit(stmt)
+    def visitWhileLoop(self, node):
+        while self.visit(node.condition):
+            self.tick()
+            for stmt in node.body:
+                self.execute(stmt)
                 if self.returnFlag:
                     return self.currentFunctionReturn
         return None
 
-    def visitFunctionDefinition(self, ctx):
-        func_name = ctx.ID().getText()
+    def visitFunctionDefinition(self, node):
         # Store function definition for later use
-        self.functions[func_name] = ctx
+        self.functions[node.name] = node
         return None
 
-    def visitFunctionCall(self, ctx):
-        func_name = ctx.ID().getText()
+    def visitFunctionCall(self, node):
+        func_name = node.name
         
         # Check if this is a built-in function
-        if func_name == 'sin':
-            arg = float(self.visit(ctx.expression(0)))
-            return math.sin(math.radians(arg))
-        elif func_name == 'cos':
-            arg = float(self.visit(ctx.expression(0)))
-            return math.cos(math.radians(arg))
-        elif func_name == 'tan':
-            arg = float(self.visit(ctx.expression(0)))
-            return math.tan(math.radians(arg))
-        elif func_name == 'sqrt':
-            arg = float(self.visit(ctx.expression(0)))
-            return math.sqrt(arg)
+        builtin = BUILTIN_FUNCTIONS.get(func_name)
+        if builtin is not None:
+            args = [self.visit(arg) for arg in node.args]
+            try:
+                return builtin(*args)
+            except (TypeError, ValueError, IndexError) as e:
+                print(f"Error: {func_name}: {e}")
+                return None
         
         # Check if it's a user-defined function
         if func_name in self.functions:
-            func_ctx = self.functions[func_name]
-            
-            # Save current variables scope
-            old_vars = self.variables.copy()
-            
-            # Create new scope for function
-            self.variables = {}
-            
-            # Process function parameters
-            if func_ctx.parameter() and ctx.expression():
-                param_list = func_ctx.parameter()
-                arg_list = ctx.expression()
-                
-                # Assign passed arguments to parameters
-                for i in range(min(len(param_list), len(arg_list))):
-                    param_name = param_list[i].ID().getText()
-                    arg_value = self.visit(arg_list[i])
-                    self.variables[param_name] = arg_value
-                
-                # Handle default parameters
-                for i in range(len(arg_list), len(param_list)):
-                    param = param_list[i]
-                    param_name = param.ID().getText()
-                    if param.literal():
-                        default_value = self.visit(param.literal())
-                        self.variables[param_name] = default_value
-            
-            # Reset return flag
-            self.returnFlag = False
-            self.currentFunctionReturn = None
-            
-            # Execute function body
-            for stmt in func_ctx.statement():
-                self.visit(stmt)
+            func = self.functions[func_name]
+            # Arguments are evaluated in the caller's scope
+            arg_values = [self.visit(arg) for arg in node.args]
+            saved_scope = self.enter_function(func, arg_values)
+            
+            # Execute function body, the trailing return runs unless an
+            # earlier return already did
+            for stmt in func.body:
+                self.execute(stmt)
                 if self.returnFlag:
                     break
+            else:
+                self.visit(func.ret)
             
-            # Get return value
-            return_value = self.currentFunctionReturn
-            
-            # Restore previous scope
-            self.variables = old_vars
-            self.returnFlag = False
-            
-            return return_value
+            return self.exit_function(saved_scope)
         
         print(f"Error: Function '{func_name}' not defined")
         return None
 
-    def visitReturnStmt(self, ctx):
-        self.currentFunctionReturn = self.visit(ctx.expression())
+    def enter_function(self, func, arg_values):
+        if self.budget is not None:
+            self.budget.enter_call()
+        
+        # Save current variables scope and create a new one for the function
+        saved_scope = (self.frame, self.scope_names)
+        self.frame = [0] * len(func.scope_names)
+        self.scope_names = func.scope_names
+        
+        # Assign passed arguments to parameters, missing ones take their defaults
+        for i, param in enumerate(func.params):
+            if i < len(arg_values):
+                self.frame[param.slot] = arg_values[i]
+            elif param.has_default:
+                self.frame[param.slot] = param.default
+        
+        # Reset return flag
+        self.returnFlag = False
+        self.currentFunctionReturn = None
+        return saved_scope
+
+    def exit_function(self, saved_scope):
+        return_value = self.currentFunctionReturn
+        
+        # Restore previous scope
+        self.frame, self.scope_names = saved_scope
+        self.returnFlag = False
+        if self.budget is not None:
+            self.budget.exit_call()
+        return return_value
+
+    def visitReturnStmt(self, node):
+        self.currentFunctionReturn = self.visit(node.value)
         self.returnFlag = True
         return None
 
-    def visitExpression(self, ctx):
-        if len(ctx.term()) == 1 and not ctx.getChildCount() > 1:
-            return self.visit(ctx.term(0))
-        
-        result = self.visit(ctx.term(0))
-        for i in range(1, len(ctx.term())):
-            op = ctx.getChild(i*2-1).getText()
-            term_value = self.visit(ctx.term(i))
+    def visitExpression(self, node):
+        result = self.visit(node.first)
+        for op, term in node.rest:
+            term_value = self.visit(term)
             
             # Ensure numeric values for operations
             if isinstance(result, str) and result.replace('.', '', 1).isdigit():
                 result = float(result)
             if isinstance(term_value, str) and term_value.replace('.', '', 1).isdigit():
                 term_value = float(term_value)
-                
-            if op == '+':
-                result += term_value
-            elif op == '-':
-                result -= term_value
-            elif op == '*':
-                result *= term_value
-            elif op == '/':
-                result /= term_value
+            
+            # Not in place: result may be an array held by a variable
+            try:
+                result = op(result, term_value)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return None
                 
         return result
 
-    def visitTerm(self, ctx):
-        if ctx.ID():
-            var_name = ctx.ID().getText()
-            return self.variables.get(var_name, 0)
-        elif ctx.NUMBER():
-            return float(ctx.NUMBER().getText())
-        elif ctx.expression():
-            return self.visit(ctx.expression())
-        elif ctx.functionCall():
-            return self.visit(ctx.functionCall())
-        return 0
-
-    def visitLiteral(self, ctx):
-        if ctx.NUMBER():
-            return float(ctx.NUMBER().getText())
-        elif ctx.STRING():
-            return ctx.STRING().getText().strip('"')
-        elif ctx.getText() == 'true':
-            return True
-        elif ctx.getText() == 'false':
-            return False
-        return None
+    def visitName(self, node):
+        slot = node.slot
+        if slot is not None:
+            return self.frame[slot]
+        # Identifiers that are not variables refer to shapes by name
+        return node.name
+
+    def visitConstant(self, node):
+        return node.value
 
-    def visitShape(self, ctx):
-        return self.visitChildren(ctx)
+    def visitArray(self, node):
+        return np.array([self.visit(element) for element in node.elements], dtype=np.float64)
 
-    def visitTriangleShape(self, ctx):
-        name = ctx.ID().getText()
-        points = [self.visit(point) for point in ctx.point()]
+    def visitTriangleShape(self, node):
+        name = node.name
+        points = [self.visit(point) for point in node.points]
+        rows = self.family_rows(name, [value for point in points for value in point])
+        if rows is not None:
+            self.store_family(name, [{
+                'type': 'triangle',
+                'points': [(row[0], row[1]), (row[2], row[3]), (row[4], row[5])]
+            } for row in rows], node.draw)
+            return None
         # Store shape for potential transformations
-        self.shapes[name] = {
+        self.store_shape(name, {
             'type': 'triangle',
             'points': points
-        }
+        })
         
-        if ctx.getText().endswith('draw'):
-            self.draw_triangle(name, points)
+        if node.draw:
+            self.draw_shape(name, self.shapes[name])
         return None
 
-    def visitCircleShape(self, ctx):
-        name = ctx.ID().getText()
-        center = self.visit(ctx.point())
-        radius = float(ctx.NUMBER().getText())
+    def visitCircleShape(self, node):
+        name = node.name
+        center = self.visit(node.center)
+        radius = self.visit(node.radius)
+        rows = self.family_rows(name, [center[0], center[1], radius])
+        if rows is not None:
+            self.store_family(name, [{
+                'type': 'circle',
+                'center': (row[0], row[1]),
+                'radius': row[2]
+            } for row in rows], node.draw)
+            return None
+        radius = float(radius)
         # Store shape for potential transformations
-        self.shapes[name] = {
+        self.store_shape(name, {
             'type': 'circle',
             'center': center,
             'radius': radius
-        }
+        })
         
-        if 'draw' in ctx.getText():
-            self.draw_circle(name, center, radius)
+        if node.draw:
+            self.draw_shape(name, self.shapes[name])
         return None
 
-    def visitRectangleShape(self, ctx):
-        name = ctx.ID().getText()
-        top_left = self.visit(ctx.point())
-        width = float(ctx.NUMBER(0).getText())
-        height = float(ctx.NUMBER(1).getText())
+    def visitRectangleShape(self, node):
+        name = node.name
+        top_left = self.visit(node.top_left)
+        width = self.visit(node.width)
+        height = self.visit(node.height)
+        rows = self.family_rows(name, [top_left[0], top_left[1], width, height])
+        if rows is not None:
+            self.store_family(name, [{
+                'type': 'rectangle',
+                'top_left': (row[0], row[1]),
+                'width': row[2],
+                'height': row[3]
+            } for row in rows], node.draw)
+            return None
+        width = float(width)
+        height = float(height)
         # Store shape for potential transformations
-        self.shapes[name] = {
+        self.store_shape(name, {
             'type': 'rectangle',
             'top_left': top_left,
             'width': width,
             'height': height
-        }
+        })
         
-        if 'draw' in ctx.getText():
-            self.draw_rectangle(name, top_left, width, height)
+        if node.draw:
+            self.draw_shape(name, self.shapes[name])
         return None
 
-    def visitPolygonShape(self, ctx):
-        name = ctx.ID().getText()
-        vertices = [self.visit(point) for point in ctx.point()]
+    def visitPolygonShape(self, node):
+        name = node.name
+        if node.path is not None:
+            # Vertex files go straight into an array, skipping the parser
+            try:
+                vertices = load_vertices(node.path)
+            except (OSError, ValueError) as e:
+                print(f"Error: Could not load polygon {name} from {node.path}: {e}")
+                return None
+        else:
+            vertices = [self.visit(point) for point in node.points]
+            rows = self.family_rows(name, [value for point in vertices for value in point])
+            if rows is not None:
+                self.store_family(name, [{
+                    'type': 'polygon',
+                    'vertices': list(zip(row[0::2], row[1::2]))
+                } for row in rows], node.draw)
+                return None
         # Store shape for potential transformations
-        self.shapes[name] = {
+        self.store_shape(name, {
             'type': 'polygon',
             'vertices': vertices
-        }
+        })
         
-        if 'draw' in ctx.getText():
-            self.draw_polygon(name, vertices)
+        if node.draw:
+            self.draw_shape(name, self.shapes[name])
         return None
 
-    def visitTransformation(self, ctx):
-        return self.visitChildren(ctx)
+    def visitTransformation(self, node):
+        if self.accounting is not None:
+            with self.accounting.phase('transform'):
+                return node.transform(self)
+        return node.transform(self)
 
-    def visitRotateTransform(self, ctx):
-        shape_name = ctx.ID().getText()
-        angle = float(ctx.NUMBER().getText())
-        
-        if shape_name in self.shapes:
+    def visitRotateTransform(self, node):
+        for shape_name, _ in self.transform_targets(node.name):
             shape = self.shapes[shape_name]
-            rotated_shape = self.rotate_shape(shape, angle)
+            rotated_shape = self.rotate_shape(shape, node.angle)
             self.shapes[shape_name] = rotated_shape
             
-            if 'draw' in ctx.getText():
+            if node.draw:
                 self.draw_shape(shape_name, rotated_shape)
         return None
 
-    def visitScaleTransform(self, ctx):
-        shape_name = ctx.ID().getText()
-        scale_factor = float(ctx.NUMBER().getText())
-        
-        if shape_name in self.shapes:
+    def visitScaleTransform(self, node):
+        for shape_name, _ in self.transform_targets(node.name):
             shape = self.shapes[shape_name]
-            scaled_shape = self.scale_shape(shape, scale_factor)
+            scaled_shape = self.scale_shape(shape, node.factor)
             self.shapes[shape_name] = scaled_shape
             
-            if 'draw' in ctx.getText():
+            if node.draw:
                 self.draw_shape(shape_name, scaled_shape)
         return None
 
-    def visitTranslateTransform(self, ctx):
-        shape_name = ctx.ID().getText()
-        translation_vector = self.visit(ctx.point())
+    def visitTranslateTransform(self, node):
+        point = self.visit(node.point)
         
-        if shape_name in self.shapes:
+        for shape_name, translation_vector in self.transform_targets(node.name, point):
             shape = self.shapes[shape_name]
             translated_shape = self.translate_shape(shape, translation_vector)
             self.shapes[shape_name] = translated_shape
             
-            if 'draw' in ctx.getText():
+            if node.draw:
                 self.draw_shape(shape_name, translated_shape)
         return None
 
-    def visitReflectTransform(self, ctx):
-        shape_name = ctx.ID().getText()
-        reflection_type = ctx.getChild(3).getText()
+    def visitReflectTransform(self, node):
+        reflection_type = node.mode
+        point = self.visit(node.point) if node.point is not None else None
         
-        if shape_name in self.shapes:
+        for shape_name, reflection_point in self.transform_targets(node.name, point):
             shape = self.shapes[shape_name]
             reflected_shape = None
             
@@ -375,21 +543,20 @@ class ShapeDrawer(DrawShapesVisitor):
             elif reflection_type == 'origin':
                 reflected_shape = self.reflect_shape_origin(shape)
             else:  # It's a point
-                reflection_point = self.visit(ctx.point())
                 reflected_shape = self.reflect_shape_point(shape, reflection_point)
             
             self.shapes[shape_name] = reflected_shape
             
-            if 'draw' in ctx.getText():
+            if node.draw:
                 self.draw_shape(shape_name, reflected_shape)
         return None
 
-    def visitAddFeatureTransform(self, ctx):
-        shape_name = ctx.ID().getText()
-        feature_type = ctx.getChild(1).getText()
-        point = self.visit(ctx.point())
+    def visitAddFeatureTransform(self, node):
+        feature_type = node.feature
         
-        if shape_name in self.shapes and self.shapes[shape_name]['type'] == 'triangle':
+        for shape_name, point in self.transform_targets(node.name, self.visit(node.point)):
+            if self.shapes[shape_name]['type'] != 'triangle':
+                continue
             shape = self.shapes[shape_name]
             if feature_type == 'median':
                 self.add_median(shape_name, shape, point)
@@ -397,51 +564,97 @@ class ShapeDrawer(DrawShapesVisitor):
                 self.add_angle_bisector(shape_name, shape, point)
             elif feature_type == 'perpendicular':
                 self.add_perpendicular(shape_name, shape, point)
+            
+            # A triangle already on a canvas, or already recorded, gets the
+            # feature drawn onto it; otherwise it shows up the next time the
+            # triangle is drawn
+            if not self.is_drawn(shape_name):
+                if node.draw:
+                    self.draw_shape(shape_name, shape)
+                elif self.recorded_draws is None:
+                    print(f"Warning: {feature_type} of {shape_name} is not drawn until {shape_name} is drawn")
         return None
 
-    def visitPrintStmt(self, ctx):
-        if ctx.STRING():
-            message = ctx.STRING().getText().strip('"')
-            print(message)
-        else:
-            result = self.visit(ctx.expression())
-            print(result)
+    def visitImportStmt(self, node):
+        self.functions.update(node.module.functions)
+        return None
+
+    def visitPrintStmt(self, node):
+        print(self.visit(node.value))
+        return None
+
+    def visitOverlapStmt(self, node):
+        # Prints the overlapping pairs among all shapes, or only the pairs
+        # involving one shape or family, and keeps them in self.overlaps
+        pairs = find_overlaps(self.shapes)
+        if node.name is not None:
+            members = set(self.families.get(node.name, [node.name]))
+            pairs = [pair for pair in pairs if pair[0] in members or pair[1] in members]
+        self.overlaps = pairs
+        if not pairs:
+            print("No overlapping shapes")
+        for first, second in pairs:
+            print(f"{first} overlaps {second}")
         return None
 
-    def visitPoint(self, ctx):
-        x = self.visit(ctx.expression(0))
-        y = self.visit(ctx.expression(1))
+    def visitPoint(self, node):
+        x = self.visit(node.x)
+        y = self.visit(node.y)
+        if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+            # Array coordinates describe one point per family member
+            return (x, y)
         return (float(x), float(y))
 
     # Drawing methods
+    def new_axes(self):
+        # Interactive runs open pyplot windows; otherwise every figure is a
+        # plain Figure on its own Agg canvas owned by this drawer, so drawers
+        # on different threads never touch pyplot's global state
+        self.figure_count += 1
+        if self.show:
+            figure = plt.figure()
+        else:
+            figure = Figure()
+            FigureCanvasAgg(figure)
+            self.figures.append(figure)
+        return figure.add_subplot()
+
+    def finish_figure(self, ax):
+        if self.show:
+            plt.show()
+
     def draw_triangle(self, name, points):
-        x_vals, y_vals = zip(*points + [points[0]])
-        plt.figure()
-        plt.plot(x_vals, y_vals, 'bo-')
-        plt.fill(x_vals, y_vals, alpha=0.3)
-        plt.text(points[0][0], points[0][1], name, fontsize=12, color="red", fontweight="bold")
-        plt.xlim(min(x_vals)-5, max(x_vals)+5)
-        plt.ylim(min(y_vals)-5, max(y_vals)+5)
-        plt.grid(True)
-        plt.title(f"Triangle {name}")
-        plt.show()
+        # Points may be a list of tuples or an (n, 2) array
+        x_vals, y_vals = zip(*list(points) + [points[0]])
+        ax = self.new_axes()
+        ax.plot(x_vals, y_vals, 'bo-')
+        ax.fill(x_vals, y_vals, alpha=0.3)
+        ax.text(points[0][0], points[0][1], name, fontsize=12, color="red", fontweight="bold")
+        ax.set_xlim(min(x_vals)-5, max(x_vals)+5)
+        ax.set_ylim(min(y_vals)-5, max(y_vals)+5)
+        ax.grid(True)
+        ax.set_title(f"Triangle {name}")
+        self.canvases[name] = ax
+        for feature_type, vertex_index in self.annotations_for(name):
+            segment = feature_segments(points, [vertex_index], feature_type)[0]
+            self.draw_segment(ax, segment)
+        self.finish_figure(ax)
 
     def draw_circle(self, name, center, radius):
-        plt.figure()
-        circle = plt.Circle(center, radius, fill=True, alpha=0.3, edgecolor='blue', facecolor='blue')
-        ax = plt.gca()
+        ax = self.new_axes()
+        circle = patches.Circle(center, radius, fill=True, alpha=0.3, edgecolor='blue', facecolor='blue')
         ax.add_patch(circle)
         ax.plot(center[0], center[1], 'bo')
-        plt.text(center[0], center[1], name, fontsize=12, color="red", fontweight="bold")
-        plt.xlim(center[0] - radius - 5, center[0] + radius + 5)
-        plt.ylim(center[1] - radius - 5, center[1] + radius + 5)
-        plt.axis('equal')
-        plt.grid(True)
-        plt.title(f"Circle {name}")
-        plt.show()
+        ax.text(center[0], center[1], name, fontsize=12, color="red", fontweight="bold")
+        ax.set_xlim(center[0] - radius - 5, center[0] + radius + 5)
+        ax.set_ylim(center[1] - radius - 5, center[1] + radius + 5)
+        ax.axis('equal')
+        ax.grid(True)
+        ax.set_title(f"Circle {name}")
+        self.finish_figure(ax)
 
     def draw_rectangle(self, name, top_left, width, height):
-        plt.figure()
+        ax = self.new_axes()
         rect = patches.Rectangle(
             top_left,
             width,
@@ -451,7 +664,6 @@ class ShapeDrawer(DrawShapesVisitor):
             facecolor='blue',
             alpha=0.3
         )
-        ax = plt.gca()
         ax.add_patch(rect)
         corners = [
             top_left,
@@ -460,32 +672,70 @@ class ShapeDrawer(DrawShapesVisitor):
             (top_left[0], top_left[1] + height)
         ]
         x_vals, y_vals = zip(*corners)
-        plt.plot(x_vals, y_vals, 'bo-')
-        plt.text(top_left[0] + width/2, top_left[1] + height/2, name, 
-                 fontsize=12, color="red", fontweight="bold",
-                 horizontalalignment='center', verticalalignment='center')
-        plt.xlim(min(x_vals)-5, max(x_vals)+5)
-        plt.ylim(min(y_vals)-5, max(y_vals)+5)
-        plt.grid(True)
-        plt.title(f"Rectangle {name}")
-        plt.show()
+        ax.plot(x_vals, y_vals, 'bo-')
+        ax.text(top_left[0] + width/2, top_left[1] + height/2, name, 
+                fontsize=12, color="red", fontweight="bold",
+                horizontalalignment='center', verticalalignment='center')
+        ax.set_xlim(min(x_vals)-5, max(x_vals)+5)
+        ax.set_ylim(min(y_vals)-5, max(y_vals)+5)
+        ax.grid(True)
+        ax.set_title(f"Rectangle {name}")
+        self.finish_figure(ax)
 
     def draw_polygon(self, name, vertices):
-        x_vals, y_vals = zip(*vertices + [vertices[0]])
-        plt.figure()
-        plt.plot(x_vals, y_vals, 'bo-')
-        plt.fill(x_vals, y_vals, alpha=0.3)
+        # Works on arrays so imported polygons are not walked vertex by vertex
+        vertices = np.asarray(vertices, dtype=np.float64)
+        closed = np.vstack([vertices, vertices[:1]])
+        x_vals, y_vals = closed[:, 0], closed[:, 1]
+        ax = self.new_axes()
+        ax.plot(x_vals, y_vals, 'bo-')
+        ax.fill(x_vals, y_vals, alpha=0.3)
         # Center of polygon
-        center_x = sum(x for x, _ in vertices) / len(vertices)
-        center_y = sum(y for _, y in vertices) / len(vertices)
-        plt.text(center_x, center_y, name, fontsize=12, color="red", fontweight="bold")
-        plt.xlim(min(x_vals)-5, max(x_vals)+5)
-        plt.ylim(min(y_vals)-5, max(y_vals)+5)
-        plt.grid(True)
-        plt.title(f"Polygon {name}")
-        plt.show()
+        center_x, center_y = vertices.mean(axis=0)
+        ax.text(center_x, center_y, name, fontsize=12, color="red", fontweight="bold")
+        ax.set_xlim(x_vals.min()-5, x_vals.max()+5)
+        ax.set_ylim(y_vals.min()-5, y_vals.max()+5)
+        ax.grid(True)
+        ax.set_title(f"Polygon {name}")
+        self.finish_figure(ax)
+
+    def save_figures(self, directory, fmt='png'):
+        # Writes the figures of a non-interactive run, named by draw order and
+        # title, and returns their paths
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for index, figure in enumerate(self.figures):
+            title = figure.axes[0].get_title() if figure.axes else ''
+            filename = f"{index:04d}_{re.sub(r'[^A-Za-z0-9_]+', '_', title).strip('_')}.{fmt}"
+            path = os.path.join(directory, filename)
+            figure.savefig(path)
+            paths.append(path)
+        return paths
 
     def draw_shape(self, name, shape):
+        if self.recorded_draws is not None:
+            self.last_recorded[name] = len(self.recorded_draws)
+            self.recorded_draws.append((name, shape, self.annotations_for(name)))
+            return
+        start = time.perf_counter()
+        if self.accounting is not None:
+            with self.accounting.phase('render'):
+                self.render_shape(name, shape)
+        else:
+            self.render_shape(name, shape)
+        RENDER_SECONDS.observe(time.perf_counter() - start)
+
+    def render_shape(self, name, shape):
+        # Culling only looks at cached bounds, before any matplotlib work
+        if self.viewport is not None and not self.viewport.intersects(self.shape_bounds(name, shape)):
+            self.render_stats['culled'] += 1
+            return
+        self.render_stats['drawn'] += 1
+        if self.lod is not None:
+            shape = self.lod.simplify_shape(name, shape)
+        if self.animation is not None:
+            self.animation.draw(name, shape)
+            return
         if shape['type'] == 'triangle':
             self.draw_triangle(name, shape['points'])
         elif shape['type'] == 'circle':
@@ -495,6 +745,49 @@ class ShapeDrawer(DrawShapesVisitor):
         elif shape['type'] == 'polygon':
             self.draw_polygon(name, shape['vertices'])
 
+    def shape_bounds(self, name, shape):
+        # Transformations store a new shape dict, which invalidates the entry
+        cached = self.bounds_cache.get(name)
+        if cached is not None and cached[0] is shape:
+            return cached[1]
+        bounds = shape_extent(shape)
+        self.bounds_cache[name] = (shape, bounds)
+        return bounds
+
+    def render_scene(self, viewport=None, output=None, labels=True):
+        # Draws every shape inside the viewport on one canvas limited to it.
+        # Returns the number of shapes drawn and culled.
+        viewport = viewport or self.viewport
+        names = list(self.shapes)
+        extents = np.array([self.shape_bounds(name, self.shapes[name]) for name in names], dtype=np.float64)
+        visible = viewport.visible_mask(extents).tolist() if names else []
+
+        ax = self.new_axes()
+        drawn = 0
+        for name, is_visible in zip(names, visible):
+            if not is_visible:
+                continue
+            shape = self.shapes[name]
+            if self.lod is not None:
+                shape = self.lod.simplify_shape(name, shape, viewport.units_per_pixel)
+            patch, anchor = shape_patch(shape)
+            ax.add_patch(patch)
+            if labels:
+                ax.text(anchor[0], anchor[1], name, fontsize=12, color="red", fontweight="bold", clip_on=True)
+            drawn += 1
+        min_x, min_y, max_x, max_y = viewport.visible_bounds
+        ax.set_xlim(min_x, max_x)
+        ax.set_ylim(min_y, max_y)
+        ax.grid(True)
+        ax.set_title(f"Scene ({drawn} shapes, {len(names) - drawn} culled)")
+        if output is not None:
+            ax.figure.savefig(output)
+            if self.show:
+                plt.close(ax.figure)
+        else:
+            self.finish_figure(ax)
+        return {'drawn': drawn, 'culled': len(names) - drawn}
+
     # Transformation methods
     def rotate_shape(self, shape, angle_degrees):
         angle_radians = math.radians(angle_degrees)
@@ -558,6 +851,15 @@ class ShapeDrawer(DrawShapesVisitor):
             return shape
             
         elif shape['type'] == 'polygon':
+            if isinstance(shape['vertices'], np.ndarray):
+                # Array-backed polygons (bulk imports) rotate as row vectors
+                center = shape['vertices'].mean(axis=0)
+                rotation = np.array([[cos_angle, sin_angle], [-sin_angle, cos_angle]])
+                return {
+                    'type': 'polygon',
+                    'vertices': (shape['vertices'] - center) @ rotation + center
+                }
+
             center_x = sum(x for x, _ in shape['vertices']) / len(shape['vertices'])
             center_y = sum(y for _, y in shape['vertices']) / len(shape['vertices'])
             
@@ -630,6 +932,13 @@ class ShapeDrawer(DrawShapesVisitor):
             }
             
         elif shape['type'] == 'polygon':
+            if isinstance(shape['vertices'], np.ndarray):
+                center = shape['vertices'].mean(axis=0)
+                return {
+                    'type': 'polygon',
+                    'vertices': center + (shape['vertices'] - center) * scale_factor
+                }
+
             center_x = sum(x for x, _ in shape['vertices']) / len(shape['vertices'])
             center_y = sum(y for _, y in shape['vertices']) / len(shape['vertices'])
             
@@ -680,7 +989,10 @@ class ShapeDrawer(DrawShapesVisitor):
             }
             
         elif shape['type'] == 'polygon':
-            translated_vertices = [(vx + tx, vy + ty) for vx, vy in shape['vertices']]
+            if isinstance(shape['vertices'], np.ndarray):
+                translated_vertices = shape['vertices'] + (tx, ty)
+            else:
+                translated_vertices = [(vx + tx, vy + ty) for vx, vy in shape['vertices']]
             return {
                 'type': 'polygon',
                 'vertices': translated_vertices
@@ -712,7 +1024,10 @@ class ShapeDrawer(DrawShapesVisitor):
             }
             
         elif shape['type'] == 'polygon':
-            reflected_vertices = [(vx, -vy) for vx, vy in shape['vertices']]
+            if isinstance(shape['vertices'], np.ndarray):
+                reflected_vertices = shape['vertices'] * (1, -1)
+            else:
+                reflected_vertices = [(vx, -vy) for vx, vy in shape['vertices']]
             return {
                 'type': 'polygon',
                 'vertices': reflected_vertices
@@ -744,7 +1059,10 @@ class ShapeDrawer(DrawShapesVisitor):
             }
             
         elif shape['type'] == 'polygon':
-            reflected_vertices = [(-vx, vy) for vx, vy in shape['vertices']]
+            if isinstance(shape['vertices'], np.ndarray):
+                reflected_vertices = shape['vertices'] * (-1, 1)
+            else:
+                reflected_vertices = [(-vx, vy) for vx, vy in shape['vertices']]
             return {
                 'type': 'polygon',
                 'vertices': reflected_vertices
@@ -776,7 +1094,10 @@ class ShapeDrawer(DrawShapesVisitor):
             }
             
         elif shape['type'] == 'polygon':
-            reflected_vertices = [(-vx, -vy) for vx, vy in shape['vertices']]
+            if isinstance(shape['vertices'], np.ndarray):
+                reflected_vertices = -shape['vertices']
+            else:
+                reflected_vertices = [(-vx, -vy) for vx, vy in shape['vertices']]
             return {
                 'type': 'polygon',
                 'vertices': reflected_vertices
@@ -823,6 +1144,12 @@ class ShapeDrawer(DrawShapesVisitor):
             }
             
         elif shape['type'] == 'polygon':
+            if isinstance(shape['vertices'], np.ndarray):
+                return {
+                    'type': 'polygon',
+                    'vertices': (2 * px, 2 * py) - shape['vertices']
+                }
+
             reflected_vertices = []
             for x, y in shape['vertices']:
                 rx = 2 * px - x
@@ -836,155 +1163,123 @@ class ShapeDrawer(DrawShapesVisitor):
             
         return shape
 
+    def canvas_for(self, name):
+        ax = self.canvases.get(name)
+        # Pyplot figures closed by the user no longer count as a canvas;
+        # figures owned by the drawer stay open
+        if ax is None or (self.show and not plt.fignum_exists(ax.figure.number)):
+            self.canvases.pop(name, None)
+            return None
+        return ax
+
+    def is_drawn(self, name):
+        # Whether features added to the shape now still show up on a draw
+        # that already happened
+        return self.canvas_for(name) is not None or name in self.last_recorded
+
+    def draw_segment(self, ax, segment):
+        if np.isfinite(segment).all():
+            ax.plot(segment[:, 0], segment[:, 1], 'r-')
+
+    def annotations_for(self, name):
+        # The shape's own features followed by those added in bulk
+        annotations = self.annotations.get(name, ())
+        for (_, feature_type), (rows, vertex_indices) in self.family_features.items():
+            row = rows.get(name)
+            if row is not None:
+                annotations += tuple((feature_type, vertex_index) for vertex_index in vertex_indices[row].tolist())
+        return annotations
+
+    def annotate_recorded_draw(self, name, added):
+        # While draws are recorded, features added after a draw land on that
+        # draw, as they would on its figure
+        index = self.last_recorded.get(name)
+        if index is not None and self.recorded_draws is not None:
+            draw_name, shape, annotations = self.recorded_draws[index]
+            self.recorded_draws[index] = (draw_name, shape, annotations + added)
+
     # Triangle-specific feature methods
-    def add_median(self, name, shape, point):
+    def add_feature(self, name, shape, point, feature_type):
         if shape['type'] != 'triangle':
-            return
-            
-        # Find the vertex closest to the given point
-        vertices = shape['points']
-        closest_vertex = min(vertices, key=lambda v: ((v[0] - point[0])**2 + (v[1] - point[1])**2)**0.5)
-        
-        # Find the opposite side's midpoint
-        vertex_index = vertices.index(closest_vertex)
-        other_vertices = [vertices[i] for i in range(3) if i != vertex_index]
-        midpoint = ((other_vertices[0][0] + other_vertices[1][0])/2, 
-                   (other_vertices[0][1] + other_vertices[1][1])/2)
-        
-        # Draw the median
-        plt.figure()
-        plt.plot([closest_vertex[0], midpoint[0]], [closest_vertex[1], midpoint[1]], 'r-')
-        
-        # Also draw the triangle
-        x_vals, y_vals = zip(*vertices + [vertices[0]])
-        plt.plot(x_vals, y_vals, 'bo-')
-        plt.fill(x_vals, y_vals, alpha=0.3)
-        
-        plt.text(vertices[0][0], vertices[0][1], f"{name} with median", 
-                fontsize=12, color="red", fontweight="bold")
-        plt.xlim(min(x_vals)-5, max(x_vals)+5)
-        plt.ylim(min(y_vals)-5, max(y_vals)+5)
-        plt.grid(True)
-        plt.title(f"Triangle {name} with Median")
-        plt.show()
+            return None
+        
+        # Features start at the vertex closest to the given point
+        vertex_index = int(closest_vertex_indices(np.array([shape['points']], dtype=float), point)[0])
+        self.annotations[name] = self.annotations.get(name, ()) + ((feature_type, vertex_index),)
+        
+        segment = feature_segments(shape['points'], [vertex_index], feature_type)[0]
+        self.annotate_recorded_draw(name, ((feature_type, vertex_index),))
+        ax = self.canvas_for(name)
+        if ax is not None:
+            self.draw_segment(ax, segment)
+            if self.show:
+                ax.figure.canvas.draw_idle()
+        return segment
+
+    def add_median(self, name, shape, point):
+        return self.add_feature(name, shape, point, 'median')
 
     def add_angle_bisector(self, name, shape, point):
-        if shape['type'] != 'triangle':
-            return
-            
-        # Find the vertex closest to the given point
-        vertices = shape['points']
-        closest_vertex = min(vertices, key=lambda v: ((v[0] - point[0])**2 + (v[1] - point[1])**2)**0.5)
-        
-        # Get the other two vertices
-        vertex_index = vertices.index(closest_vertex)
-        other_indices = [(vertex_index + 1) % 3, (vertex_index + 2) % 3]
-        other_vertices = [vertices[i] for i in other_indices]
-        
-        # Calculate vectors from the vertex to the other two vertices
-        v1 = (other_vertices[0][0] - closest_vertex[0], other_vertices[0][1] - closest_vertex[1])
-        v2 = (other_vertices[1][0] - closest_vertex[0], other_vertices[1][1] - closest_vertex[1])
-        
-        # Normalize vectors
-        v1_norm = math.sqrt(v1[0]**2 + v1[1]**2)
-        v2_norm = math.sqrt(v2[0]**2 + v2[1]**2)
-        
-        v1_unit = (v1[0] / v1_norm, v1[1] / v1_norm)
-        v2_unit = (v2[0] / v2_norm, v2[1] / v2_norm)
-        
-        # Calculate the bisector vector
-        bisector = (v1_unit[0] + v2_unit[0], v1_unit[1] + v2_unit[1])
-        bisector_norm = math.sqrt(bisector[0]**2 + bisector[1]**2)
-        
-        if bisector_norm > 0:
-            bisector_unit = (bisector[0] / bisector_norm, bisector[1] / bisector_norm)
-            
-            # Determine length of bisector line (use the longest distance to keep it in proportion)
-            max_dist = max(v1_norm, v2_norm)
-            end_point = (closest_vertex[0] + bisector_unit[0] * max_dist,
-                         closest_vertex[1] + bisector_unit[1] * max_dist)
-            
-            # Draw the angle bisector
-            plt.figure()
-            plt.plot([closest_vertex[0], end_point[0]], [closest_vertex[1], end_point[1]], 'r-')
-            
-            # Also draw the triangle
-            x_vals, y_vals = zip(*vertices + [vertices[0]])
-            plt.plot(x_vals, y_vals, 'bo-')
-            plt.fill(x_vals, y_vals, alpha=0.3)
-            
-            plt.text(vertices[0][0], vertices[0][1], f"{name} with bisector", 
-                    fontsize=12, color="red", fontweight="bold")
-            plt.xlim(min(x_vals)-5, max(x_vals)+5)
-            plt.ylim(min(y_vals)-5, max(y_vals)+5)
-            plt.grid(True)
-            plt.title(f"Triangle {name} with Angle Bisector")
-            plt.show()
+        return self.add_feature(name, shape, point, 'bisector')
 
     def add_perpendicular(self, name, shape, point):
-        if shape['type'] != 'triangle':
-            return
-            
-        # Find the vertex closest to the given point
-        vertices = shape['points']
-        closest_vertex = min(vertices, key=lambda v: ((v[0] - point[0])**2 + (v[1] - point[1])**2)**0.5)
-        
-        # Get the other two vertices to define the opposite side
-        vertex_index = vertices.index(closest_vertex)
-        other_indices = [(vertex_index + 1) % 3, (vertex_index + 2) % 3]
-        side_vertex1 = vertices[other_indices[0]]
-        side_vertex2 = vertices[other_indices[1]]
-        
-        # Calculate the line parameters for the opposite side (ax + by + c = 0)
-        a = side_vertex2[1] - side_vertex1[1]
-        b = side_vertex1[0] - side_vertex2[0]
-        c = side_vertex2[0] * side_vertex1[1] - side_vertex1[0] * side_vertex2[1]
-        
-        # Calculate the foot of the perpendicular
-        # The perpendicular line through closest_vertex has slope -b/a if a!=0
-        if a != 0:
-            # Perpendicular line equation: y - vertex_y = (-b/a)(x - vertex_x)
-            # Simplified: a(x - vertex_x) + b(y - vertex_y) = 0
-            # ax - a*vertex_x + by - b*vertex_y = 0
-            # ax + by = a*vertex_x + b*vertex_y
-            
-            # Intersection of perpendicular line with the opposite side
-            # Solve the system of equations:
-            # ax + by + c = 0 (opposite side)
-            # ax + by = a*vertex_x + b*vertex_y (perpendicular line)
-            
-            # For numerical stability, use the fact that the dot product of the 
-            # direction vector of the line and the perpendicular is zero
-            line_dir = (side_vertex2[0] - side_vertex1[0], side_vertex2[1] - side_vertex1[1])
-            line_length = math.sqrt(line_dir[0]**2 + line_dir[1]**2)
-            
-            if line_length > 0:
-                # Normalize line direction
-                line_dir = (line_dir[0] / line_length, line_dir[1] / line_length)
-                
-                # Vector from side_vertex1 to closest_vertex
-                to_vertex = (closest_vertex[0] - side_vertex1[0], closest_vertex[1] - side_vertex1[1])
-                
-                # Project this vector onto the line
-                projection_length = to_vertex[0] * line_dir[0] + to_vertex[1] * line_dir[1]
-                
-                # Calculate foot point
-                foot_point = (side_vertex1[0] + projection_length * line_dir[0],
-                              side_vertex1[1] + projection_length * line_dir[1])
-                
-                # Draw the perpendicular
-                plt.figure()
-                plt.plot([closest_vertex[0], foot_point[0]], [closest_vertex[1], foot_point[1]], 'r-')
-                
-                # Also draw the triangle
-                x_vals, y_vals = zip(*vertices + [vertices[0]])
-                plt.plot(x_vals, y_vals, 'bo-')
-                plt.fill(x_vals, y_vals, alpha=0.3)
-                
-                plt.text(vertices[0][0], vertices[0][1], f"{name} with perpendicular", 
-                        fontsize=12, color="red", fontweight="bold")
-                plt.xlim(min(x_vals)-5, max(x_vals)+5)
-                plt.ylim(min(y_vals)-5, max(y_vals)+5)
-                plt.grid(True)
-                plt.title(f"Triangle {name} with Perpendicular")
-                plt.show()
\ No newline at end of file
+        return self.add_feature(name, shape, point, 'perpendicular')
+
+    def add_features_bulk(self, feature_types=FEATURE_TYPES, point=None, family=None):
+        # Annotates every triangle, or every triangle of a family, in one
+        # vectorized pass. With a point the features start at each triangle's
+        # closest vertex, otherwise at all three vertices. The features are
+        # stored once for the whole family, replacing what an earlier call
+        # stored for the same feature and family. Returns the triangle names
+        # and, per feature type, an (n, k, 2, 2) array of segments with
+        # k = 1 or 3.
+        candidates = self.shapes if family is None else self.families.get(family, ())
+        names = [name for name in candidates if self.shapes[name]['type'] == 'triangle']
+        if not names:
+            return names, {}
+        # Flattened without numpy inferring the nesting of every point list
+        coordinates = chain.from_iterable(chain.from_iterable(self.shapes[name]['points'] for name in names))
+        triangles = np.fromiter(coordinates, dtype=float, count=6 * len(names)).reshape(-1, 3, 2)
+        
+        if point is None:
+            vertex_indices = np.tile(np.arange(3), (len(names), 1))
+        else:
+            vertex_indices = closest_vertex_indices(triangles, point)[:, None]
+        rows = dict(zip(names, range(len(names))))
+        
+        segments = all_feature_segments(triangles, vertex_indices, feature_types)
+        new = {}
+        for feature_type in feature_types:
+            # Triangles already showing this feature at the same vertices
+            # are not drawn again
+            previous = self.family_features.get((family, feature_type))
+            if previous is not None and previous[0].keys() == rows.keys() and previous[1].shape == vertex_indices.shape:
+                new[feature_type] = (vertex_indices != previous[1]).any(axis=1)
+            else:
+                new[feature_type] = np.ones(len(names), dtype=bool)
+            self.family_features[(family, feature_type)] = (rows, vertex_indices)
+        
+        # Only triangles already drawn need their latest draw or canvas updated
+        drawn = [(name, rows[name]) for name in set(self.last_recorded).union(self.canvases) if name in rows]
+        by_canvas = {}
+        for name, row in drawn:
+            added = tuple((feature_type, vertex_index) for feature_type in feature_types if new[feature_type][row]
+                          for vertex_index in vertex_indices[row].tolist())
+            if added:
+                self.annotate_recorded_draw(name, added)
+            ax = self.canvas_for(name) if name in self.canvases else None
+            if ax is not None:
+                by_canvas.setdefault(ax, []).append(row)
+        
+        # One line collection per existing canvas instead of an artist per line
+        for ax, canvas_rows in by_canvas.items():
+            canvas_rows = np.array(canvas_rows)
+            lines = np.concatenate([segments[feature_type][canvas_rows[new[feature_type][canvas_rows]]].reshape(-1, 2, 2)
+                                    for feature_type in feature_types])
+            lines = lines[np.isfinite(lines).all(axis=(1, 2))]
+            if len(lines):
+                ax.add_collection(LineCollection(lines, colors='red'))
+                if self.show:
+                    ax.figure.canvas.draw_idle()
+        
+        return names, segments
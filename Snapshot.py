@@ -0,0 +1,131 @@
+import json
+import mmap
+import struct
+import numpy as np
+from ShapeDrawer import ShapeDrawer
+from SyntaxTree import tree_to_data, tree_from_data
+
+MAGIC = b'CDSLSNP2'
+PREFIX = struct.Struct('<8sQ')
+SHAPE_KINDS = ('triangle', 'circle', 'rectangle', 'polygon')
+KIND_CODES = {kind: code for code, kind in enumerate(SHAPE_KINDS)}
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def shape_coordinates(shape):
+    kind = shape['type']
+    if kind == 'triangle':
+        return np.asarray(shape['points'], dtype=np.float64).ravel()
+    if kind == 'polygon':
+        return np.asarray(shape['vertices'], dtype=np.float64).ravel()
+    if kind == 'circle':
+        return np.array([shape['center'][0], shape['center'][1], shape['radius']], dtype=np.float64)
+    if kind == 'rectangle':
+        return np.array([shape['top_left'][0], shape['top_left'][1], shape['width'], shape['height']], dtype=np.float64)
+    raise ValueError(f"Unknown shape type '{kind}'")
+
+
+def pack_shapes(shapes):
+    # Flattens a shapes dict into names plus three arrays: a kind code per
+    # shape, offsets into the coordinate array and the coordinates themselves
+    names = list(shapes)
+    kinds = np.fromiter((KIND_CODES[shapes[name]['type']] for name in names), dtype=np.uint8, count=len(names))
+    parts = [shape_coordinates(shapes[name]) for name in names]
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(part) for part in parts], out=offsets[1:])
+    coords = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float64)
+    return names, kinds, offsets, coords
+
+
+def unpack_shape_list(kinds, offsets, coords):
+    # Shapes share memory with coords: points and vertices are (n, 2) views
+    shapes = []
+    bounds = offsets.tolist()
+    for index, code in enumerate(kinds.tolist()):
+        values = coords[bounds[index]:bounds[index + 1]]
+        kind = SHAPE_KINDS[code]
+        if kind == 'triangle':
+            shapes.append({'type': 'triangle', 'points': values.reshape(3, 2)})
+        elif kind == 'polygon':
+            shapes.append({'type': 'polygon', 'vertices': values.reshape(-1, 2)})
+        elif kind == 'circle':
+            shapes.append({'type': 'circle', 'center': values[:2], 'radius': float(values[2])})
+        else:
+            shapes.append({'type': 'rectangle', 'top_left': values[:2], 'width': float(values[2]), 'height': float(values[3])})
+    return shapes
+
+
+def unpack_shapes(names, kinds, offsets, coords):
+    return dict(zip(names, unpack_shape_list(kinds, offsets, coords)))
+
+
+def encode_value(value):
+    # Array variables are stored as lists and tagged so they load as arrays
+    if isinstance(value, np.ndarray):
+        return {'array': value.tolist()}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict) and 'array' in value:
+        return np.array(value['array'], dtype=np.float64)
+    return value
+
+
+def save_snapshot(drawer, path):
+    names, kinds, offsets, coords = pack_shapes(drawer.shapes)
+    header = json.dumps({
+        'variables': {name: encode_value(value) for name, value in drawer.variables.items()},
+        # Function definitions are stored resolved, as the module cache
+        # stores them, so loading never runs the parser
+        'functions': tree_to_data(tuple(drawer.functions.values())),
+        'names': names,
+        'annotations': {name: list(pairs) for name, pairs in zip(names, map(drawer.annotations_for, names)) if pairs},
+        'families': drawer.families,
+        'shape_count': len(names),
+        'coord_count': len(coords)
+    }).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        position = PREFIX.size + len(header)
+        for array in (kinds, offsets, coords):
+            padding = _align(position) - position
+            f.write(b'\0' * padding)
+            f.write(array.tobytes())
+            position += padding + array.nbytes
+
+
+def load_snapshot(path, drawer=None, **drawer_options):
+    with open(path, 'rb') as f:
+        # The mapping stays alive as long as any shape array refers to it
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, header_length = PREFIX.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a C-DSL snapshot")
+    position = PREFIX.size + header_length
+    header = json.loads(bytes(buffer[PREFIX.size:position]).decode('utf-8'))
+
+    arrays = []
+    for dtype, count in ((np.uint8, header['shape_count']),
+                         (np.int64, header['shape_count'] + 1),
+                         (np.float64, header['coord_count'])):
+        position = _align(position)
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=position)
+        arrays.append(array)
+        position += array.nbytes
+    kinds, offsets, coords = arrays
+
+    if drawer is None:
+        drawer = ShapeDrawer(**drawer_options)
+    drawer.variables = {name: decode_value(value) for name, value in header['variables'].items()}
+    drawer.functions = {function.name: function for function in tree_from_data(header['functions'])}
+    drawer.shapes = unpack_shapes(header['names'], kinds, offsets, coords)
+    drawer.annotations = {name: tuple(map(tuple, pairs)) for name, pairs in header['annotations'].items()}
+    drawer.families = header.get('families', {})
+    return drawer
@@ -0,0 +1,153 @@
+from SyntaxTree import FunctionCall, FunctionDefinition, Conditional, ForLoop, WhileLoop, iter_children
+from ShapeDrawer import ShapeDrawer
+from Builtins import BUILTIN_FUNCTIONS
+
+_MISSING = object()
+
+
+class StackShapeDrawer(ShapeDrawer):
+    # Runs DSL function calls and the control flow around them on an explicit
+    # stack of generators instead of nested Python frames, so the depth of DSL
+    # recursion is only limited by the budget's max_call_depth.
+    #
+    # Each routine on the stack is a generator that yields (function, args)
+    # when it needs the result of a user function call. The driver loop in
+    # run() pushes a routine for the function body and sends the return value
+    # back once it finishes. Statements without user calls anywhere inside are
+    # handed to the regular visitor, which only nests as deep as the source.
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        # User function calls per context, outermost first in evaluation order
+        self.user_call_cache = {}
+        # Results of the calls resolved for the statement being visited
+        self.call_results = {}
+
+    def visitProgram(self, program):
+        if not self.resolve(program):
+            return None
+        self.run(self.exec_block(program.statements))
+        return None
+
+    def run(self, routine):
+        stack = [routine]
+        value = None
+        while stack:
+            try:
+                request = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                continue
+            function, arg_values = request
+            stack.append(self.exec_function(function, arg_values))
+            value = None
+        return value
+
+    def visitFunctionCall(self, node):
+        value = self.call_results.get(node, _MISSING)
+        if value is not _MISSING:
+            return value
+        return super().visitFunctionCall(node)
+
+    def user_calls(self, node):
+        calls = self.user_call_cache.get(node)
+        if calls is None:
+            calls = []
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                if isinstance(current, FunctionCall) and current.name not in BUILTIN_FUNCTIONS:
+                    # Calls nested in the arguments are resolved with the call
+                    calls.append(current)
+                elif isinstance(current, FunctionDefinition):
+                    # A definition only stores its body, the calls in it run
+                    # when the function does
+                    continue
+                else:
+                    stack.extend(reversed(list(iter_children(current))))
+            self.user_call_cache[node] = calls
+        return calls
+
+    def resolve_calls(self, node, results):
+        for call in self.user_calls(node):
+            function = self.functions.get(call.name)
+            if function is None:
+                # Left to the visitor, which reports the unknown function
+                continue
+            arg_values = []
+            for arg in call.args:
+                yield from self.resolve_calls(arg, results)
+                self.call_results = results
+                arg_values.append(self.visit(arg))
+            results[call] = yield function, arg_values
+
+    def evaluate(self, node):
+        # Evaluates an expression, condition or simple statement once every
+        # user call inside it has a result
+        results = {}
+        if self.user_calls(node):
+            yield from self.resolve_calls(node, results)
+        self.call_results = results
+        return self.visit(node)
+
+    def exec_function(self, function, arg_values):
+        saved_scope = self.enter_function(function, arg_values)
+        returned = yield from self.exec_block(function.body)
+        if not returned:
+            yield from self.evaluate(function.ret)
+        return self.exit_function(saved_scope)
+
+    def exec_block(self, statements):
+        # Returns True when a return statement ran
+        for stmt in statements:
+            yield from self.exec_statement(stmt)
+            if self.returnFlag:
+                return True
+        return False
+
+    def exec_statement(self, stmt):
+        self.statement_count += 1
+        self.tick()
+        if not self.user_calls(stmt):
+            stmt.accept(self)
+        elif isinstance(stmt, Conditional):
+            yield from self.exec_conditional(stmt)
+        elif isinstance(stmt, ForLoop):
+            yield from self.exec_for_loop(stmt)
+        elif isinstance(stmt, WhileLoop):
+            yield from self.exec_while_loop(stmt)
+        else:
+            yield from self.evaluate(stmt)
+
+    def exec_conditional(self, node):
+        for condition, body in node.branches:
+            if (yield from self.evaluate(condition)):
+                return (yield from self.exec_block(body))
+        if node.else_body is not None:
+            return (yield from self.exec_block(node.else_body))
+        return False
+
+    def exec_for_loop(self, node):
+        start_val = int((yield from self.evaluate(node.start))) if node.start is not None else 0
+        end_val = int((yield from self.evaluate(node.end)))
+
+        original_value = self.frame[node.slot]
+        returned = False
+        for i in range(start_val, end_val):
+            self.tick()
+            self.frame[node.slot] = i
+            returned = yield from self.exec_block(node.body)
+            if returned:
+                break
+
+        # Restore original variable value
+        self.frame[node.slot] = original_value
+        return returned
+
+    def exec_while_loop(self, node):
+        while (yield from self.evaluate(node.condition)):
+            self.tick()
+            if (yield from self.exec_block(node.body)):
+                return True
+        return False
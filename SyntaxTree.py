@@ -0,0 +1,618 @@
+import operator
+from antlr4.tree.Tree import TerminalNode
+from DrawShapesParser import DrawShapesParser
+from DrawShapesVisitor import DrawShapesVisitor
+
+# A compact syntax tree the interpreter runs on instead of the ANTLR parse
+# tree. Everything the parse tree only offers as text is decided once while
+# building: draw flags, operators, comparisons, reflection modes, feature
+# types and literal values. Nodes keep no reference to the parse tree, so it
+# can be released as soon as the program is built.
+#
+# Every node lists the fields holding child nodes in fields, in source
+# order, and calls the matching visit method of a visitor in accept().
+
+OPERATORS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+COMPARISONS = {'==': operator.eq, '<': operator.lt, '>': operator.gt,
+               '<=': operator.le, '>=': operator.ge, '!=': operator.ne}
+
+
+class Node:
+    __slots__ = ()
+    fields = ()
+
+
+def iter_children(node):
+    for field in node.fields:
+        yield from _flatten(getattr(node, field))
+
+
+def _flatten(value):
+    if isinstance(value, Node):
+        yield value
+    elif isinstance(value, tuple):
+        for item in value:
+            yield from _flatten(item)
+
+
+def walk(node):
+    # Every node below and including node, parents before children
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(list(iter_children(current))))
+
+
+class Program(Node):
+    __slots__ = ('statements', 'sources')
+    fields = ('statements',)
+
+    def __init__(self, statements, sources):
+        self.statements = statements
+        # Source text of every top-level statement
+        self.sources = sources
+
+    def accept(self, visitor):
+        return visitor.visitProgram(self)
+
+
+# Expressions
+
+class Constant(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def accept(self, visitor):
+        return visitor.visitConstant(self)
+
+
+class Name(Node):
+    __slots__ = ('name', 'line', 'column', 'slot')
+
+    def __init__(self, name, line, column):
+        self.name = name
+        self.line = line
+        self.column = column
+        # Set by the Resolver, None for names of shapes
+        self.slot = None
+
+    def accept(self, visitor):
+        return visitor.visitName(self)
+
+
+class Array(Node):
+    __slots__ = ('elements',)
+    fields = ('elements',)
+
+    def __init__(self, elements):
+        self.elements = elements
+
+    def accept(self, visitor):
+        return visitor.visitArray(self)
+
+
+class FunctionCall(Node):
+    __slots__ = ('name', 'args')
+    fields = ('args',)
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def accept(self, visitor):
+        return visitor.visitFunctionCall(self)
+
+
+class Expression(Node):
+    # first followed by (operator, term) pairs, evaluated left to right
+    __slots__ = ('first', 'rest')
+    fields = ('first', 'rest')
+
+    def __init__(self, first, rest):
+        self.first = first
+        self.rest = rest
+
+    def accept(self, visitor):
+        return visitor.visitExpression(self)
+
+
+class Condition(Node):
+    __slots__ = ('left', 'compare', 'right')
+    fields = ('left', 'right')
+
+    def __init__(self, left, compare, right):
+        self.left = left
+        self.compare = compare
+        self.right = right
+
+    def accept(self, visitor):
+        return visitor.visitCondition(self)
+
+
+class Point(Node):
+    __slots__ = ('x', 'y')
+    fields = ('x', 'y')
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def accept(self, visitor):
+        return visitor.visitPoint(self)
+
+
+# Statements
+
+class Assignment(Node):
+    __slots__ = ('name', 'value', 'slot')
+    fields = ('value',)
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.slot = None
+
+    def accept(self, visitor):
+        return visitor.visitAssignment(self)
+
+
+class Conditional(Node):
+    # branches holds (condition, statements) pairs for if and every else if
+    __slots__ = ('branches', 'else_body')
+    fields = ('branches', 'else_body')
+
+    def __init__(self, branches, else_body):
+        self.branches = branches
+        self.else_body = else_body
+
+    def accept(self, visitor):
+        return visitor.visitConditional(self)
+
+
+class ForLoop(Node):
+    # Runs from start (0 when None) up to end
+    __slots__ = ('name', 'start', 'end', 'body', 'slot')
+    fields = ('start', 'end', 'body')
+
+    def __init__(self, name, start, end, body):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.body = body
+        self.slot = None
+
+    def accept(self, visitor):
+        return visitor.visitForLoop(self)
+
+
+class WhileLoop(Node):
+    __slots__ = ('condition', 'body')
+    fields = ('condition', 'body')
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+    def accept(self, visitor):
+        return visitor.visitWhileLoop(self)
+
+
+class Parameter(Node):
+    __slots__ = ('name', 'has_default', 'default', 'slot')
+
+    def __init__(self, name, has_default, default):
+        self.name = name
+        self.has_default = has_default
+        self.default = default
+        self.slot = None
+
+
+class FunctionDefinition(Node):
+    __slots__ = ('name', 'params', 'body', 'ret', 'scope_names', 'source')
+    fields = ('params', 'body', 'ret')
+
+    def __init__(self, name, params, body, ret, source):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.ret = ret
+        # Set by the Resolver
+        self.scope_names = None
+        self.source = source
+
+    def accept(self, visitor):
+        return visitor.visitFunctionDefinition(self)
+
+
+class ReturnStmt(Node):
+    __slots__ = ('value',)
+    fields = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def accept(self, visitor):
+        return visitor.visitReturnStmt(self)
+
+
+class PrintStmt(Node):
+    __slots__ = ('value',)
+    fields = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def accept(self, visitor):
+        return visitor.visitPrintStmt(self)
+
+
+class OverlapStmt(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def accept(self, visitor):
+        return visitor.visitOverlapStmt(self)
+
+
+class ImportStmt(Node):
+    __slots__ = ('path', 'module')
+
+    def __init__(self, path):
+        self.path = path
+        # The loaded Module, set before the program runs
+        self.module = None
+
+    def accept(self, visitor):
+        return visitor.visitImportStmt(self)
+
+
+class Shape(Node):
+    __slots__ = ()
+
+
+class TriangleShape(Shape):
+    __slots__ = ('name', 'points', 'draw')
+    fields = ('points',)
+
+    def __init__(self, name, points, draw):
+        self.name = name
+        self.points = points
+        self.draw = draw
+
+    def accept(self, visitor):
+        return visitor.visitTriangleShape(self)
+
+
+class CircleShape(Shape):
+    __slots__ = ('name', 'center', 'radius', 'draw')
+    fields = ('center', 'radius')
+
+    def __init__(self, name, center, radius, draw):
+        self.name = name
+        self.center = center
+        self.radius = radius
+        self.draw = draw
+
+    def accept(self, visitor):
+        return visitor.visitCircleShape(self)
+
+
+class RectangleShape(Shape):
+    __slots__ = ('name', 'top_left', 'width', 'height', 'draw')
+    fields = ('top_left', 'width', 'height')
+
+    def __init__(self, name, top_left, width, height, draw):
+        self.name = name
+        self.top_left = top_left
+        self.width = width
+        self.height = height
+        self.draw = draw
+
+    def accept(self, visitor):
+        return visitor.visitRectangleShape(self)
+
+
+class PolygonShape(Shape):
+    # Either points or the path of a vertex file is set
+    __slots__ = ('name', 'points', 'path', 'draw')
+    fields = ('points',)
+
+    def __init__(self, name, points, path, draw):
+        self.name = name
+        self.points = points
+        self.path = path
+        self.draw = draw
+
+    def accept(self, visitor):
+        return visitor.visitPolygonShape(self)
+
+
+class Transformation(Node):
+    # Visitors see every transformation through visitTransformation, which
+    # calls transform() to reach the specific visit method
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitTransformation(self)
+
+
+class RotateTransform(Transformation):
+    __slots__ = ('name', 'angle', 'draw')
+
+    def __init__(self, name, angle, draw):
+        self.name = name
+        self.angle = angle
+        self.draw = draw
+
+    def transform(self, visitor):
+        return visitor.visitRotateTransform(self)
+
+
+class ScaleTransform(Transformation):
+    __slots__ = ('name', 'factor', 'draw')
+
+    def __init__(self, name, factor, draw):
+        self.name = name
+        self.factor = factor
+        self.draw = draw
+
+    def transform(self, visitor):
+        return visitor.visitScaleTransform(self)
+
+
+class TranslateTransform(Transformation):
+    __slots__ = ('name', 'point', 'draw')
+    fields = ('point',)
+
+    def __init__(self, name, point, draw):
+        self.name = name
+        self.point = point
+        self.draw = draw
+
+    def transform(self, visitor):
+        return visitor.visitTranslateTransform(self)
+
+
+class ReflectTransform(Transformation):
+    # mode is 'x-axis', 'y-axis', 'origin' or 'point'
+    __slots__ = ('name', 'mode', 'point', 'draw')
+    fields = ('point',)
+
+    def __init__(self, name, mode, point, draw):
+        self.name = name
+        self.mode = mode
+        self.point = point
+        self.draw = draw
+
+    def transform(self, visitor):
+        return visitor.visitReflectTransform(self)
+
+
+class AddFeatureTransform(Transformation):
+    # feature is 'median', 'bisector' or 'perpendicular'
+    __slots__ = ('name', 'feature', 'point', 'draw')
+    fields = ('point',)
+
+    def __init__(self, name, feature, point, draw):
+        self.name = name
+        self.feature = feature
+        self.point = point
+        self.draw = draw
+
+    def transform(self, visitor):
+        return visitor.visitAddFeatureTransform(self)
+
+
+def _node_classes(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _node_classes(subclass)
+
+
+NODE_CLASSES = {cls.__name__: cls for cls in _node_classes(Node)}
+SYMBOLS = {function: symbol for table in (OPERATORS, COMPARISONS) for symbol, function in table.items()}
+
+
+def tree_to_data(value):
+    # A syntax tree as plain JSON values: nodes become dicts naming their
+    # class, tuples become lists and operators their symbols. Reading it back
+    # with tree_from_data can only ever create syntax tree nodes.
+    if isinstance(value, Node):
+        data = {'node': type(value).__name__}
+        for slot in type(value).__slots__:
+            data[slot] = tree_to_data(getattr(value, slot))
+        return data
+    if isinstance(value, tuple):
+        return [tree_to_data(item) for item in value]
+    if isinstance(value, list):
+        return {'list': [tree_to_data(item) for item in value]}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if callable(value) and value in SYMBOLS:
+        return {'operator': SYMBOLS[value]}
+    raise ValueError(f"Cannot store a {type(value).__name__} from a syntax tree")
+
+
+def tree_from_data(data):
+    # Only lists and dicts need converting, plain values are used as they are
+    if type(data) is list:
+        return tuple([tree_from_data(item) if type(item) in (list, dict) else item for item in data])
+    if 'node' in data:
+        cls = NODE_CLASSES.get(data['node'])
+        if cls is None:
+            raise ValueError(f"Unknown syntax tree node '{data['node']}'")
+        node = cls.__new__(cls)
+        for slot in cls.__slots__:
+            value = data[slot]
+            if type(value) in (list, dict):
+                value = tree_from_data(value)
+            setattr(node, slot, value)
+        return node
+    if 'operator' in data:
+        symbol = data['operator']
+        return OPERATORS[symbol] if symbol in OPERATORS else COMPARISONS[symbol]
+    if 'list' in data:
+        return list(tree_from_data(data['list']))
+    raise ValueError("Unknown value in syntax tree data")
+
+
+def source_text(ctx):
+    return ctx.start.getInputStream().getText(ctx.start.start, ctx.stop.stop)
+
+
+def has_draw(ctx):
+    # Only the keyword counts, not identifiers that happen to contain it
+    last = ctx.getChild(ctx.getChildCount() - 1)
+    return isinstance(last, TerminalNode) and last.symbol.type != DrawShapesParser.ID and last.getText() == 'draw'
+
+
+class SyntaxTreeBuilder(DrawShapesVisitor):
+    # Converts an ANTLR parse tree into the nodes above
+
+    def visitProgram(self, ctx):
+        statements = ctx.statement()
+        return Program(tuple(self.visit(stmt) for stmt in statements),
+                       tuple(source_text(stmt) for stmt in statements))
+
+    def visitStatement(self, ctx):
+        return self.visit(ctx.getChild(0))
+
+    def block(self, statements):
+        return tuple(self.visit(stmt) for stmt in statements)
+
+    def visitAssignment(self, ctx):
+        if ctx.STRING():
+            value = Constant(ctx.STRING().getText().strip('"'))
+        else:
+            value = self.visit(ctx.expression())
+        return Assignment(ctx.ID().getText(), value)
+
+    def visitConditional(self, ctx):
+        branches = [(self.visit(ctx.condition()), self.block(ctx.statement()))]
+        for part in ctx.elseIfPart():
+            branches.append((self.visit(part.condition()), self.block(part.statement())))
+        else_body = self.block(ctx.elsePart().statement()) if ctx.elsePart() else None
+        return Conditional(tuple(branches), else_body)
+
+    def visitCondition(self, ctx):
+        return Condition(self.visit(ctx.expression(0)), COMPARISONS[ctx.comparison().getText()], self.visit(ctx.expression(1)))
+
+    def visitForLoop(self, ctx):
+        if ctx.INT():
+            start, end = None, Constant(int(ctx.INT().getText()))
+        elif len(ctx.expression()) == 1:
+            start, end = None, self.visit(ctx.expression(0))
+        else:
+            start, end = self.visit(ctx.expression(0)), self.visit(ctx.expression(1))
+        return ForLoop(ctx.ID().getText(), start, end, self.block(ctx.statement()))
+
+    def visitWhileLoop(self, ctx):
+        return WhileLoop(self.visit(ctx.condition()), self.block(ctx.statement()))
+
+    def visitFunctionDefinition(self, ctx):
+        params = []
+        for param in ctx.parameter():
+            if param.literal():
+                params.append(Parameter(param.ID().getText(), True, self.visit(param.literal()).value))
+            else:
+                params.append(Parameter(param.ID().getText(), False, None))
+        return FunctionDefinition(ctx.ID().getText(), tuple(params), self.block(ctx.statement()),
+                                  self.visit(ctx.returnStmt()), source_text(ctx))
+
+    def visitReturnStmt(self, ctx):
+        return ReturnStmt(self.visit(ctx.expression()))
+
+    def visitFunctionCall(self, ctx):
+        return FunctionCall(ctx.ID().getText(), tuple(self.visit(arg) for arg in ctx.expression()))
+
+    def visitExpression(self, ctx):
+        terms = [self.visit(term) for term in ctx.term()]
+        if len(terms) == 1:
+            return terms[0]
+        ops = [OPERATORS[ctx.getChild(i * 2 - 1).getText()] for i in range(1, len(terms))]
+        return Expression(terms[0], tuple(zip(ops, terms[1:])))
+
+    def visitTerm(self, ctx):
+        if ctx.ID():
+            token = ctx.ID().getSymbol()
+            return Name(token.text, token.line, token.column)
+        elif ctx.NUMBER():
+            return Constant(float(ctx.NUMBER().getText()))
+        elif ctx.expression():
+            return self.visit(ctx.expression())
+        elif ctx.functionCall():
+            return self.visit(ctx.functionCall())
+        elif ctx.array():
+            return self.visit(ctx.array())
+        return Constant(0)
+
+    def visitArray(self, ctx):
+        return Array(tuple(self.visit(element) for element in ctx.expression()))
+
+    def visitLiteral(self, ctx):
+        if ctx.NUMBER():
+            return Constant(float(ctx.NUMBER().getText()))
+        elif ctx.STRING():
+            return Constant(ctx.STRING().getText().strip('"'))
+        return Constant(ctx.getText() == 'true')
+
+    def visitShape(self, ctx):
+        return self.visit(ctx.getChild(0))
+
+    def visitTriangleShape(self, ctx):
+        return TriangleShape(ctx.ID().getText(), tuple(self.visit(point) for point in ctx.point()), has_draw(ctx))
+
+    def visitCircleShape(self, ctx):
+        return CircleShape(ctx.ID().getText(), self.visit(ctx.point()), self.visit(ctx.expression()), has_draw(ctx))
+
+    def visitRectangleShape(self, ctx):
+        return RectangleShape(ctx.ID().getText(), self.visit(ctx.point()), self.visit(ctx.expression(0)),
+                              self.visit(ctx.expression(1)), has_draw(ctx))
+
+    def visitPolygonShape(self, ctx):
+        if ctx.STRING():
+            return PolygonShape(ctx.ID().getText(), (), ctx.STRING().getText().strip('"'), has_draw(ctx))
+        return PolygonShape(ctx.ID().getText(), tuple(self.visit(point) for point in ctx.point()), None, has_draw(ctx))
+
+    def visitTransformation(self, ctx):
+        return self.visit(ctx.getChild(0))
+
+    def visitRotateTransform(self, ctx):
+        return RotateTransform(ctx.ID().getText(), float(ctx.NUMBER().getText()), has_draw(ctx))
+
+    def visitScaleTransform(self, ctx):
+        return ScaleTransform(ctx.ID().getText(), float(ctx.NUMBER().getText()), has_draw(ctx))
+
+    def visitTranslateTransform(self, ctx):
+        return TranslateTransform(ctx.ID().getText(), self.visit(ctx.point()), has_draw(ctx))
+
+    def visitReflectTransform(self, ctx):
+        if ctx.point():
+            return ReflectTransform(ctx.ID().getText(), 'point', self.visit(ctx.point()), has_draw(ctx))
+        return ReflectTransform(ctx.ID().getText(), ctx.getChild(3).getText(), None, has_draw(ctx))
+
+    def visitAddFeatureTransform(self, ctx):
+        return AddFeatureTransform(ctx.ID().getText(), ctx.getChild(1).getText(), self.visit(ctx.point()), has_draw(ctx))
+
+    def visitPrintStmt(self, ctx):
+        if ctx.STRING():
+            return PrintStmt(Constant(ctx.STRING().getText().strip('"')))
+        return PrintStmt(self.visit(ctx.expression()))
+
+    def visitOverlapStmt(self, ctx):
+        return OverlapStmt(ctx.ID().getText() if ctx.ID() else None)
+
+    def visitImportStmt(self, ctx):
+        return ImportStmt(ctx.STRING().getText().strip('"'))
+
+    def visitPoint(self, ctx):
+        return Point(self.visit(ctx.expression(0)), self.visit(ctx.expression(1)))
+
+
+def build_program(tree):
+    return SyntaxTreeBuilder().visit(tree)
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class Viewport:
+    # A window into the scene: bounds as (min_x, min_y, max_x, max_y) seen at
+    # zoom 1, and a zoom factor that magnifies around the center of the
+    # bounds. pixels is the output size the visible area is rendered at.
+
+    def __init__(self, bounds, zoom=1.0, pixels=(640, 480)):
+        min_x, min_y, max_x, max_y = bounds
+        if max_x <= min_x or max_y <= min_y:
+            raise ValueError(f"Empty viewport bounds {bounds}")
+        if zoom <= 0:
+            raise ValueError(f"Zoom must be positive, got {zoom}")
+        self.bounds = (min_x, min_y, max_x, max_y)
+        self.zoom = zoom
+        self.pixels = pixels
+
+    @property
+    def visible_bounds(self):
+        min_x, min_y, max_x, max_y = self.bounds
+        center_x, center_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        half_width = (max_x - min_x) / (2 * self.zoom)
+        half_height = (max_y - min_y) / (2 * self.zoom)
+        return center_x - half_width, center_y - half_height, center_x + half_width, center_y + half_height
+
+    @property
+    def units_per_pixel(self):
+        min_x, min_y, max_x, max_y = self.visible_bounds
+        return max((max_x - min_x) / self.pixels[0], (max_y - min_y) / self.pixels[1])
+
+    def intersects(self, extent):
+        min_x, min_y, max_x, max_y = self.visible_bounds
+        return extent[0] <= max_x and extent[2] >= min_x and extent[1] <= max_y and extent[3] >= min_y
+
+    def visible_mask(self, extents):
+        # extents is an (n, 4) array of shape bounds
+        min_x, min_y, max_x, max_y = self.visible_bounds
+        extents = np.asarray(extents, dtype=np.float64).reshape(-1, 4)
+        return ((extents[:, 0] <= max_x) & (extents[:, 2] >= min_x) &
+                (extents[:, 1] <= max_y) & (extents[:, 3] >= min_y))
@@ -0,0 +1,334 @@
+import difflib
+import os
+import re
+import sys
+import time
+from antlr4 import InputStream, CommonTokenStream
+from DrawShapesLexer import DrawShapesLexer
+from DrawShapesParser import DrawShapesParser
+from ShapeDrawer import ShapeDrawer
+from SyntaxTree import (Name, FunctionCall, Transformation, OverlapStmt, Assignment, ForLoop,
+                        FunctionDefinition, ImportStmt, build_program, iter_children)
+from main import DSLErrorListener, parse_lock
+
+
+class TrackingDict(dict):
+    # A dict that remembers which keys were set or removed since the last
+    # call to take_changes()
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.changed = set()
+
+    def __setitem__(self, key, value):
+        self.changed.add(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.changed.add(key)
+        super().__delitem__(key)
+
+    def pop(self, key, *default):
+        self.changed.add(key)
+        return super().pop(key, *default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def take_changes(self):
+        changed = self.changed
+        self.changed = set()
+        return changed
+
+
+_MISSING = object()
+
+
+class WatchDrawer(ShapeDrawer):
+    # Remembers which shape and annotations each drawn shape's latest figure
+    # shows, so edits that change either without running a draw statement
+    # still re-render it
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.drawn = {}
+
+    def draw_shape(self, name, shape):
+        self.drawn[name] = (shape, self.annotations.get(name, ()))
+        return super().draw_shape(name, shape)
+
+    def is_drawn(self, name):
+        # Shapes drawn in an earlier update are drawn again with their new
+        # features once the update finishes
+        return name in self.drawn or super().is_drawn(name)
+
+    def add_feature(self, name, shape, point, feature_type):
+        on_canvas = self.canvas_for(name) is not None
+        segment = super().add_feature(name, shape, point, feature_type)
+        if on_canvas and name in self.drawn:
+            self.drawn[name] = (self.drawn[name][0], self.annotations.get(name, ()))
+        return segment
+
+
+class StatementRecord:
+    # One top-level statement of the last run: its source text, the keys it
+    # reads, and the values it left behind for every key it wrote. Keys are
+    # 'v:name' for variables, 's:name' for shapes, shape families and their
+    # annotations, and 'f:name' for functions.
+    def __init__(self, text, reads):
+        self.text = text
+        self.reads = reads
+        self.variables = {}
+        self.shapes = {}
+        self.families = {}
+        self.annotations = {}
+        self.functions = set()
+
+    @property
+    def writes(self):
+        keys = {'v:' + name for name in self.variables}
+        keys.update('s:' + name for name in self.shapes)
+        keys.update('s:' + name for name in self.families)
+        keys.update('s:' + name for name in self.annotations)
+        keys.update('f:' + name for name in self.functions)
+        return keys
+
+
+class IncrementalRunner:
+    # Re-runs a script after edits, executing only the top-level statements
+    # whose text changed and the statements that read something those wrote.
+    # Every other statement replays the values it wrote last time, so it costs
+    # a few dict updates and renders nothing.
+
+    def __init__(self, output_dir=None, **drawer_options):
+        drawer_options.setdefault('show', output_dir is None)
+        self.drawer = WatchDrawer(**drawer_options)
+        self.output_dir = output_dir
+        self.records = []
+
+    def parse(self, source):
+        lexer = DrawShapesLexer(InputStream(source))
+        error_listener = DSLErrorListener()
+        lexer.removeErrorListeners()
+        lexer.addErrorListener(error_listener)
+        parser = DrawShapesParser(CommonTokenStream(lexer))
+        parser.removeErrorListeners()
+        parser.addErrorListener(error_listener)
+        with parse_lock:
+            tree = parser.program()
+        if error_listener.has_error:
+            return None
+        return build_program(tree)
+
+    def function_reads(self, program):
+        # Shapes and functions each function reads, including through the
+        # functions it calls
+        direct = {}
+        for stmt in program.statements:
+            if isinstance(stmt, FunctionDefinition):
+                reads = set()
+                for child in stmt.body:
+                    self.collect_reads(child, reads, {}, global_scope=False)
+                self.collect_reads(stmt.ret, reads, {}, global_scope=False)
+                direct[stmt.name] = reads
+        closed = {}
+        for name in direct:
+            reads, pending, seen = set(), [name], set()
+            while pending:
+                current = pending.pop()
+                if current in seen or current not in direct:
+                    continue
+                seen.add(current)
+                for key in direct[current]:
+                    if key.startswith('f:'):
+                        pending.append(key[2:])
+                    if not key.startswith('v:'):
+                        reads.add(key)
+            closed[name] = reads
+        return closed
+
+    def collect_reads(self, node, reads, function_reads, global_scope=True):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, FunctionDefinition):
+                continue
+            if isinstance(node, Name):
+                if global_scope and node.slot is not None:
+                    reads.add('v:' + node.name)
+            elif isinstance(node, FunctionCall):
+                reads.add('f:' + node.name)
+                reads.update(function_reads.get(node.name, ()))
+            elif isinstance(node, Transformation):
+                reads.add('s:' + node.name)
+            elif isinstance(node, OverlapStmt):
+                reads.add('s:*')
+            stack.extend(iter_children(node))
+        return reads
+
+    def variable_writes(self, node):
+        names = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, FunctionDefinition):
+                continue
+            if isinstance(node, (Assignment, ForLoop)):
+                names.add(node.name)
+            stack.extend(iter_children(node))
+        return names
+
+    def is_dirty(self, reads, dirty):
+        if reads & dirty:
+            return True
+        return 's:*' in reads and any(key.startswith('s:') for key in dirty)
+
+    def update(self, source):
+        # Returns counts of statements, executed statements and figures drawn,
+        # or None when the source does not parse
+        program = self.parse(source)
+        if program is None:
+            print("Execution stopped due to syntax errors.")
+            return None
+
+        drawer = self.drawer
+        drawer.variables = {}
+        drawer.shapes = TrackingDict()
+        drawer.families = TrackingDict()
+        drawer.annotations = TrackingDict()
+        drawer.functions = {}
+        # Figures of the last update are finished, features never land on them
+        drawer.canvases = {}
+        if not drawer.resolve(program):
+            return None
+
+        statements = program.statements
+        # An import counts as changed when the module or anything it imports did
+        texts = [text + ' ' + stmt.module.version if isinstance(stmt, ImportStmt) else text
+                 for stmt, text in zip(statements, program.sources)]
+        old_records = self.records
+        matches = {}
+        dirty = set()
+        matcher = difflib.SequenceMatcher(None, [record.text for record in old_records], texts, autojunk=False)
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == 'equal':
+                for offset in range(new_end - new_start):
+                    matches[new_start + offset] = old_records[old_start + offset]
+            else:
+                # Whatever removed or replaced statements wrote is stale
+                for record in old_records[old_start:old_end]:
+                    dirty |= record.writes
+
+        function_reads = self.function_reads(program)
+        figures_before = drawer.figure_count
+        records = []
+        executed = 0
+        for index, stmt in enumerate(statements):
+            old = matches.get(index)
+            reads = self.collect_reads(stmt, set(), function_reads)
+            # A statement whose branch did not run last time would replay the
+            # old value of a variable it may write, so a changed upstream
+            # value of that variable runs it again
+            writes = {'v:' + name for name in self.variable_writes(stmt)}
+            if old is not None and not self.is_dirty(reads | writes, dirty):
+                record = old
+                record.reads = reads
+                self.replay(record)
+                # Function nodes belong to the program they were built from
+                if isinstance(stmt, (FunctionDefinition, ImportStmt)):
+                    drawer.visit(stmt)
+            else:
+                record = self.execute(stmt, texts[index], reads)
+                dirty |= record.writes
+                if old is not None:
+                    dirty |= old.writes
+                executed += 1
+            records.append(record)
+        self.records = records
+        self.redraw_changed()
+
+        if self.output_dir is not None:
+            self.save_new_figures()
+        return {'statements': len(statements), 'executed': executed, 'rendered': drawer.figure_count - figures_before}
+
+    def redraw_changed(self):
+        # Shapes whose latest figure no longer shows the shape or the features
+        # they end up with, for instance after a transformation was deleted or
+        # a feature moved to another vertex, are drawn again
+        drawer = self.drawer
+        for name, (shape, annotations) in list(drawer.drawn.items()):
+            current = drawer.shapes.get(name)
+            if current is None:
+                del drawer.drawn[name]
+            elif current is not shape or drawer.annotations.get(name, ()) != annotations:
+                drawer.draw_shape(name, current)
+
+    def replay(self, record):
+        drawer = self.drawer
+        for name, value in record.variables.items():
+            drawer.frame[drawer.global_scope.slots[name]] = value
+        for target, values in ((drawer.shapes, record.shapes), (drawer.families, record.families),
+                               (drawer.annotations, record.annotations)):
+            for name, value in values.items():
+                if value is _MISSING:
+                    target.pop(name, None)
+                else:
+                    target[name] = value
+
+    def execute(self, stmt, text, reads):
+        drawer = self.drawer
+        record = StatementRecord(text, reads)
+        for tracked in (drawer.shapes, drawer.families, drawer.annotations):
+            tracked.take_changes()
+        drawer.execute(stmt)
+        for name in self.variable_writes(stmt):
+            record.variables[name] = drawer.frame[drawer.global_scope.slots[name]]
+        for tracked, values in ((drawer.shapes, record.shapes), (drawer.families, record.families),
+                                (drawer.annotations, record.annotations)):
+            for name in tracked.take_changes():
+                values[name] = tracked.get(name, _MISSING)
+        if isinstance(stmt, FunctionDefinition):
+            record.functions.add(stmt.name)
+        elif isinstance(stmt, ImportStmt):
+            record.functions.update(stmt.module.functions)
+        return record
+
+    def save_new_figures(self):
+        # Each figure is saved under its title, replacing the previous render
+        # of the same shape
+        os.makedirs(self.output_dir, exist_ok=True)
+        for figure in self.drawer.figures:
+            title = figure.axes[0].get_title() if figure.axes else 'figure'
+            figure.savefig(os.path.join(self.output_dir, re.sub(r'[^A-Za-z0-9_]+', '_', title).strip('_') + '.png'))
+        self.drawer.figures.clear()
+
+
+def watch(path, interval=0.5, output_dir=None, **drawer_options):
+    # Polls the file and re-runs it incrementally whenever it changes
+    runner = IncrementalRunner(output_dir=output_dir, **drawer_options)
+    last_modified = None
+    try:
+        while True:
+            try:
+                modified = os.stat(path).st_mtime_ns
+            except OSError:
+                modified = None
+            if modified is not None and modified != last_modified:
+                last_modified = modified
+                with open(path) as f:
+                    source = f.read()
+                start = time.perf_counter()
+                stats = runner.update(source)
+                if stats is not None:
+                    print(f"Ran {stats['executed']} of {stats['statements']} statements, "
+                          f"rendered {stats['rendered']} figures in {time.perf_counter() - start:.3f}s")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return runner
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python Watch.py SCRIPT [OUTPUT_DIR]")
+        sys.exit(1)
+    watch(sys.argv[1], output_dir=sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,79 @@
+import sys
+import time
+import numpy as np
+from Intersections import find_overlaps, brute_force_overlaps, candidate_pairs, shape_extents
+
+# Compares the hierarchical grid overlap search with checking every pair on
+# random scenes of mixed shapes at constant density: spread over a square,
+# stacked in one column where every box shares the same x range, or mixed
+# sizes where one shape in ten is a rectangle spanning most of the scene.
+# The candidate search is timed on its own as well, since in the mixed scene
+# the exact tests of the many true overlaps dominate.
+# Usage: python bench_intersections.py [max brute force size]
+
+SCENES = {
+    'square': (100, 300, 1000, 3000, 10000, 30000, 100000),
+    'column': (100, 300, 1000, 3000, 10000, 30000, 100000),
+    'mixed': (100, 300, 1000, 2000, 4000)
+}
+# Full searches are only timed up to this many candidate pairs
+MAX_EXACT_PAIRS = 200000
+
+
+def random_scene(count, seed=0, column=False, large_share=0.0):
+    rng = np.random.default_rng(seed)
+    size = np.sqrt(count) * 5
+    shapes = {}
+    for i in range(count):
+        if column:
+            x, y = rng.uniform(0, 1), rng.uniform(0, count * 2)
+        else:
+            x, y = rng.uniform(0, size, 2)
+        kind = i % 4
+        if large_share and rng.uniform() < large_share:
+            corner = rng.uniform(0, size * 0.1, 2)
+            shapes[f"S{i}"] = {'type': 'rectangle', 'top_left': tuple(corner), 'width': size * rng.uniform(0.5, 0.9),
+                               'height': size * rng.uniform(0.5, 0.9)}
+        elif kind == 0:
+            shapes[f"S{i}"] = {'type': 'circle', 'center': (x, y), 'radius': rng.uniform(0.5, 3)}
+        elif kind == 1:
+            shapes[f"S{i}"] = {'type': 'rectangle', 'top_left': (x, y), 'width': rng.uniform(1, 4), 'height': rng.uniform(1, 4)}
+        elif kind == 2:
+            shapes[f"S{i}"] = {'type': 'triangle', 'points': [(x, y), (x + rng.uniform(1, 4), y), (x, y + rng.uniform(1, 4))]}
+        else:
+            angles = np.sort(rng.uniform(0, 2 * np.pi, 6))
+            radii = rng.uniform(1, 3, 6)
+            shapes[f"S{i}"] = {'type': 'polygon', 'vertices': list(zip(x + radii * np.cos(angles), y + radii * np.sin(angles)))}
+    return shapes
+
+
+def timed(function, shapes):
+    start = time.perf_counter()
+    result = function(shapes)
+    return result, time.perf_counter() - start
+
+
+def main():
+    brute_force_limit = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{'scene':>7} {'shapes':>8} {'pairs':>9} {'cand s':>8} {'overlaps':>9} {'grid s':>9} {'brute s':>9} {'speedup':>8}")
+    for scene, counts in SCENES.items():
+        for count in counts:
+            shapes = random_scene(count, column=scene == 'column', large_share=0.1 if scene == 'mixed' else 0.0)
+            extents = shape_extents(shapes, list(shapes))
+            pairs, candidate_time = timed(candidate_pairs, extents)
+            row = f"{scene:>7} {count:>8} {len(pairs):>9} {candidate_time:>8.3f}"
+            if len(pairs) > MAX_EXACT_PAIRS:
+                print(f"{row} {'-':>9} {'-':>9} {'-':>9} {'-':>8}")
+                continue
+            overlaps, grid_time = timed(find_overlaps, shapes)
+            if count <= brute_force_limit:
+                expected, brute_time = timed(brute_force_overlaps, shapes)
+                if expected != overlaps:
+                    print(f"Mismatch for {count} shapes in a {scene} scene")
+                print(f"{row} {len(overlaps):>9} {grid_time:>9.3f} {brute_time:>9.3f} {brute_time / grid_time:>7.0f}x")
+            else:
+                print(f"{row} {len(overlaps):>9} {grid_time:>9.3f} {'-':>9} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
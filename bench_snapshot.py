@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import time
+from main import parse_and_run
+from Snapshot import save_snapshot, load_snapshot
+
+# Times saving and loading snapshots of scripts with many function
+# definitions and shapes. Loading rebuilds the stored syntax trees of the
+# functions without running the parser, so it should stay well under the
+# time the same functions take to parse; each loaded snapshot is checked by
+# calling its last function.
+# Usage: python bench_snapshot.py [shapes]
+
+FUNCTION_COUNTS = (10, 100, 300, 1000)
+
+
+def script(functions, shapes):
+    lines = []
+    for index in range(functions):
+        lines.append(f"function f{index}(x, y = {index}) {{\n    z = x * 2 + y\n    if (z > 10) {{ z = z - 1 }}\n    return z\n}}")
+    lines.append(f"circle C center (arange({shapes}), 0) radius 1")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    shapes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{'functions':>9} {'shapes':>7} {'kB':>8} {'run s':>8} {'save s':>8} {'load s':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in FUNCTION_COUNTS:
+            start = time.perf_counter()
+            drawer = parse_and_run(script(count, shapes), show=False, parallel=False)
+            run_time = time.perf_counter() - start
+            path = os.path.join(directory, f"{count}.snap")
+            start = time.perf_counter()
+            save_snapshot(drawer, path)
+            save_time = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = load_snapshot(path, show=False)
+            load_time = time.perf_counter() - start
+
+            variant = parse_and_run(f"r = f{count - 1}(3)\n", snapshot=path, show=False, parallel=False)
+            expected = 6 + count - 1
+            expected -= expected > 10
+            if len(loaded.functions) != count or len(loaded.shapes) != shapes or variant.variables['r'] != expected:
+                print(f"Mismatch after loading {count} functions")
+            print(f"{count:>9} {shapes:>7} {os.path.getsize(path) / 1024:>8.0f} {run_time:>8.3f} {save_time:>8.3f} {load_time:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,20 @@
+import threading
+import time
 from antlr4 import *
 from antlr4.error.ErrorListener import ErrorListener
 from ShapeDrawer import ShapeDrawer
+from StackInterpreter import StackShapeDrawer
+from ExecutionBudget import BudgetExceededError
+from Snapshot import load_snapshot
+from Accounting import phase
+from SyntaxTree import build_program
+import Metrics
 from DrawShapesLexer import DrawShapesLexer
 from DrawShapesParser import DrawShapesParser
 from DrawShapesVisitor import DrawShapesVisitor
 
+parse_lock = threading.Lock()
+
 class DSLErrorListener(ErrorListener):
     def __init__(self):
         super(DSLErrorListener, self).__init__()
@@ -14,9 +24,22 @@ class DSLErrorListener(ErrorListener):
     def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
         self.has_error = True
         self.error_message = f"Error at line {line}:{column} - {msg}"
+        Metrics.SYNTAX_ERRORS.inc()
         print(self.error_message)
 
-def parse_and_run(input_text):
+def record_metrics(drawer, status, seconds):
+    Metrics.EXECUTE_SECONDS.observe(seconds)
+    Metrics.SCRIPTS.inc(1, (status,))
+    Metrics.STATEMENTS.inc(drawer.statement_count)
+    Metrics.SHAPES_CREATED.inc(drawer.shapes_created)
+    Metrics.SHAPES_DRAWN.inc(drawer.render_stats['drawn'])
+    Metrics.SHAPES_CULLED.inc(drawer.render_stats['culled'])
+    Metrics.registry.flush()
+
+def parse_and_run(input_text, budget=None, snapshot=None, animation=None, parallel=True, explicit_stack=False, lod=None, viewport=None, show=True, accounting=None, record_draws=False):
+    # An optional ResourceAccount records per-phase costs of this run
+    if accounting is not None:
+        accounting.start()
     input_stream = InputStream(input_text)
     lexer = DrawShapesLexer(input_stream)
     
@@ -30,14 +53,60 @@ def parse_and_run(input_text):
     parser.removeErrorListeners()
     parser.addErrorListener(error_listener)
     
-    tree = parser.program()
+    # Generated parsers share their DFA caches between instances, so
+    # scripts parsed on different threads take turns
+    with parse_lock, phase(accounting, 'parse'):
+        start = time.perf_counter()
+        tree = parser.program()
+        program = None if error_listener.has_error else build_program(tree)
+        Metrics.PARSE_SECONDS.observe(time.perf_counter() - start)
+    
+    # The interpreter only needs the compact tree, the parse tree and its
+    # tokens can go
+    del tree, parser, stream, lexer, input_stream
     
-    if error_listener.has_error:
+    if program is None:
         print("Execution stopped due to syntax errors.")
+        if accounting is not None:
+            accounting.finish(status='syntax_error')
+        Metrics.SCRIPTS.inc(1, ('syntax_error',))
+        Metrics.registry.flush()
         return
     
-    visitor = ShapeDrawer()
-    visitor.visit(tree)
+    # Variant scripts continue from a saved base state instead of re-running it
+    # The explicit-stack interpreter runs deep DSL recursion without Python recursion
+    drawer_class = StackShapeDrawer if explicit_stack else ShapeDrawer
+    visitor = drawer_class(budget=budget, animation=animation, parallel=parallel, lod=lod, viewport=viewport, show=show, accounting=accounting)
+    if snapshot is not None:
+        load_snapshot(snapshot, drawer=visitor)
+    if record_draws:
+        # Draws are left to the caller, in order, as (name, shape,
+        # annotations) with the features each draw shows
+        visitor.recorded_draws = []
+    status = 'error'
+    start = time.perf_counter()
+    try:
+        with phase(accounting, 'interpret'):
+            visitor.visit(program)
+        # A program stopped by failed imports or unknown names never ran
+        status = visitor.resolve_status or 'ok'
+    except BudgetExceededError as e:
+        status = 'budget_exceeded'
+        Metrics.BUDGET_VIOLATIONS.inc(1, (e.kind,))
+        # Keep the partial statistics around for callers, the shapes created
+        # so far stay available on the visitor
+        visitor.budget_error = e
+        print(f"Execution stopped: {e}")
+        print(f"Partial statistics: {e.stats}")
+    finally:
+        if animation is not None:
+            animation.close()
+        if accounting is not None:
+            visitor.accounting_record = accounting.finish(visitor, status)
+        record_metrics(visitor, status, time.perf_counter() - start)
+    if viewport is not None:
+        print(f"Viewport: drawn {visitor.render_stats['drawn']}, culled {visitor.render_stats['culled']}")
+    return visitor
 
 # Example 1 - Basic shapes and conditionals (as in the original)
 example1 = '''
@@ -120,8 +189,9 @@ rotate R by 30 degrees draw
 reflect P by y-axis draw
 '''
 
-parse_and_run(example1)
-# parse_and_run(example2)
-# parse_and_run(example3)
-# parse_and_run(example4)
-# parse_and_run(example5)
\ No newline at end of file
+if __name__ == '__main__':
+    parse_and_run(example1)
+    # parse_and_run(example2)
+    # parse_and_run(example3)
+    # parse_and_run(example4)
+    # parse_and_run(example5)
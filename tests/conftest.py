@@ -0,0 +1,8 @@
+import os
+import sys
+import matplotlib
+
+# Modules live at the top of the repository, next to the parser generated by
+# install.sh; figures are rendered off screen
+matplotlib.use('Agg')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+import json
+import tracemalloc
+
+from Accounting import ResourceAccount
+from ExecutionBudget import ExecutionBudget
+from main import parse_and_run
+
+SCRIPT = 'for i in range(0, 50) {\ncircle C center (i, 0) radius 1\n}'
+
+
+def test_record_is_appended_with_growth_figures(tmp_path):
+    output = tmp_path / 'accounting.jsonl'
+    drawer = parse_and_run(SCRIPT, show=False, parallel=False, accounting=ResourceAccount(str(output), 'a'))
+    record = drawer.accounting_record
+    assert json.loads(output.read_text()) == record
+    assert record['status'] == 'ok'
+    assert record['script'] == 'a'
+    assert record['shapes'] == 1
+    assert record['phases']['interpret']['calls'] == 1
+    assert record['rss_start_mb'] > 0
+    assert record['peak_rss_growth_mb'] >= 0
+    # The absolute peak covers the whole process, the growth only this run
+    assert record['peak_rss_mb'] > 0
+    assert record['peak_rss_mb'] >= record['peak_rss_growth_mb']
+    assert not tracemalloc.is_tracing()
+
+
+def test_budget_status_reaches_the_record():
+    drawer = parse_and_run(SCRIPT, show=False, parallel=False, budget=ExecutionBudget(max_steps=10),
+                           accounting=ResourceAccount())
+    assert drawer.accounting_record['status'] == 'budget_exceeded'
+
+
+def test_tracing_started_elsewhere_keeps_running():
+    tracemalloc.start()
+    try:
+        parse_and_run(SCRIPT, show=False, parallel=False, accounting=ResourceAccount())
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
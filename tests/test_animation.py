@@ -0,0 +1,39 @@
+import os
+import numpy as np
+from PIL import Image
+
+from Animation import Animation
+from main import parse_and_run
+
+SCRIPT = '''polygon P vertices ((0,0), (10,0), (10,10), (0,10)) draw
+circle C center (20,20) radius 4 draw
+for i in range(0, 6) {
+    rotate P by 15 degrees draw
+}
+'''
+
+
+def animate(output):
+    animation = Animation(output, limits=(-5, -5, 40, 40), fps=5)
+    parse_and_run(SCRIPT, animation=animation, show=False, parallel=False)
+    return animation
+
+
+def test_apng_matches_frame_sequence(tmp_path):
+    png = animate(str(tmp_path / 'out.png'))
+    sequence = animate(str(tmp_path / 'frames'))
+    assert png.frame_count == sequence.frame_count == 6
+    names = sorted(os.listdir(tmp_path / 'frames'))
+    with Image.open(tmp_path / 'out.png') as image:
+        assert image.n_frames == len(names) == 6
+        assert image.info['duration'] == 200
+        for index, name in enumerate(names):
+            image.seek(index)
+            expected = np.asarray(Image.open(tmp_path / 'frames' / name).convert('RGB'))
+            assert np.array_equal(np.asarray(image.convert('RGB')), expected)
+
+
+def test_apng_without_frames_writes_nothing(tmp_path):
+    animation = Animation(str(tmp_path / 'empty.png'))
+    assert animation.close() == 0
+    assert not os.path.exists(tmp_path / 'empty.png')
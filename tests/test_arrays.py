@@ -0,0 +1,44 @@
+import numpy as np
+
+from main import parse_and_run
+
+
+def run(source):
+    return parse_and_run(source, show=False, parallel=False)
+
+
+def test_array_family_broadcasts_scalars():
+    drawer = run('circle C center ([0, 10, 20], 5) radius [1, 2, 3]\n')
+    assert drawer.families['C'] == ['C_0', 'C_1', 'C_2']
+    assert [drawer.shapes[name]['center'] for name in drawer.families['C']] == [(0, 5), (10, 5), (20, 5)]
+    assert [drawer.shapes[name]['radius'] for name in drawer.families['C']] == [1, 2, 3]
+
+
+def test_triangle_family_members():
+    drawer = run('triangle T ([0, 1], 0), ([4, 5], 0), (0, 3)\n')
+    assert drawer.shapes['T_1']['points'] == [(1, 0), (5, 0), (0, 3)]
+
+
+def test_array_expressions_work_element_wise(capsys):
+    drawer = run('a = [1, 2, 3] * 2 + 1\nif (a > 2) { print "all" }\nif (a > 3) { print "some" }\n')
+    assert np.array_equal(drawer.variables['a'], [3, 5, 7])
+    assert capsys.readouterr().out == 'all\n'
+
+
+def test_mismatched_family_prints_error(capsys):
+    drawer = run('triangle T (0, 0), (4, 0), (0, 3)\ntriangle T ([0, 1], 0), ([1, 2, 3], 0), (0, 1)\nprint 1\n')
+    out = capsys.readouterr().out
+    assert out.startswith('Error: Arrays of lengths 2, 3 used together in T\n')
+    assert out.endswith('1.0\n')
+    # The earlier triangle is left as it was
+    assert drawer.shapes['T']['points'] == [(0, 0), (4, 0), (0, 3)]
+    assert 'T' not in drawer.families
+
+
+def test_mismatched_expression_prints_error(capsys):
+    drawer = run('a = [1, 2] + [1, 2, 3]\nif ([1, 2] == [1, 2, 3]) { print "equal" }\nprint 2\n')
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith('Error: ') and lines[1].startswith('Error: ')
+    assert lines[2] == '2.0'
+    assert drawer.variables['a'] is None
@@ -0,0 +1,46 @@
+from main import parse_and_run
+from ExecutionBudget import ExecutionBudget, BudgetExceededError
+
+
+def run(script, **budget_options):
+    return parse_and_run(script, budget=ExecutionBudget(**budget_options), show=False, parallel=False)
+
+
+def test_unlimited_budget_counts_steps():
+    drawer = run('x = 0\nfor i in range(0, 10) { x = x + 1 }')
+    assert not hasattr(drawer, 'budget_error')
+    assert drawer.variables['x'] == 10
+    assert drawer.budget.steps > 10
+
+
+def test_step_limit_is_exact():
+    drawer = run('for i in range(0, 100) { x = i }', max_steps=50)
+    error = drawer.budget_error
+    assert isinstance(error, BudgetExceededError)
+    assert error.kind == 'steps'
+    assert error.stats['steps'] == 51
+
+
+def test_shape_limit_keeps_partial_state():
+    drawer = run('circle A center (0, 0) radius 1\ncircle B center (1, 0) radius 1\ncircle C center (2, 0) radius 1', max_shapes=2)
+    assert drawer.budget_error.kind == 'shapes'
+    assert set(drawer.shapes) == {'A', 'B', 'C'}
+    assert drawer.budget_error.to_dict()['error'] == 'budget_exceeded'
+
+
+def test_call_depth_limit():
+    script = '''
+function down(n) {
+    if (n > 0) { return down(n - 1) }
+    return 0
+}
+x = down(50)
+'''
+    drawer = run(script, max_call_depth=10)
+    assert drawer.budget_error.kind == 'call_depth'
+    assert drawer.budget_error.stats['deepest_call'] == 11
+
+
+def test_time_limit():
+    drawer = run('x = 0\nwhile (x > -1) { x = x + 1 }', max_seconds=0.2, check_interval=100)
+    assert drawer.budget_error.kind == 'time'
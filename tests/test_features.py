@@ -0,0 +1,76 @@
+from main import parse_and_run
+
+
+def run(script):
+    return parse_and_run(script, show=False, parallel=False)
+
+
+def test_feature_after_last_draw_lands_on_existing_figure(capsys):
+    drawer = run('triangle T (0,0), (20,0), (10,15) draw\nadd median to T from (0, 0)')
+    assert len(drawer.figures) == 1
+    ax = drawer.canvases['T']
+    # The outline plus the median
+    assert len(ax.lines) == 2
+    assert drawer.annotations['T'] == (('median', 0),)
+    assert 'Warning' not in capsys.readouterr().out
+
+
+def test_feature_without_canvas_warns(capsys):
+    drawer = run('triangle T (0,0), (20,0), (10,15)\nadd bisector to T from (20, 0)')
+    assert drawer.figures == []
+    assert 'Warning: bisector of T is not drawn until T is drawn' in capsys.readouterr().out
+
+
+def test_feature_is_drawn_with_the_next_draw():
+    drawer = run('triangle T (0,0), (20,0), (10,15)\nadd median to T from (0, 0)\nrotate T by 10 draw')
+    assert len(drawer.figures) == 1
+    assert len(drawer.canvases['T'].lines) == 2
+
+
+def test_draw_flag_draws_feature_without_canvas():
+    drawer = run('triangle T (0,0), (20,0), (10,15)\nadd perpendicular to T from (10, 15) draw')
+    assert len(drawer.figures) == 1
+    assert len(drawer.canvases['T'].lines) == 2
+
+
+BULK = 'triangle T (0,0), (20,0), (10,15) draw\ntriangle U ([0, 5], 0), (4,0), (0,4)\ncircle C center (0, 0) radius 1\n'
+
+
+def test_bulk_features_are_stored_once_per_family():
+    drawer = run(BULK)
+    names, segments = drawer.add_features_bulk(('median',), point=(0, 0))
+    assert names == ['T', 'U_0', 'U_1']
+    assert segments['median'].shape == (3, 1, 2, 2)
+    assert drawer.annotations == {}
+    assert drawer.annotations_for('U_1') == (('median', 1),)
+    # Calling again replaces the feature instead of adding it twice
+    drawer.add_features_bulk(('median',), point=(20, 0))
+    assert drawer.annotations_for('T') == (('median', 1),)
+    assert list(drawer.family_features) == [(None, 'median')]
+
+
+def test_bulk_features_of_one_family():
+    drawer = run(BULK)
+    names, _ = drawer.add_features_bulk(('bisector',), family='U')
+    assert names == ['U_0', 'U_1']
+    assert drawer.annotations_for('T') == ()
+    assert drawer.annotations_for('U_0') == (('bisector', 0), ('bisector', 1), ('bisector', 2))
+
+
+def test_bulk_features_draw_on_existing_canvas_once():
+    drawer = run(BULK)
+    ax = drawer.canvases['T']
+    drawer.add_features_bulk(point=(0, 0))
+    drawer.add_features_bulk(point=(0, 0))
+    assert len(ax.collections) == 1
+    assert len(ax.collections[0].get_segments()) == 3
+    drawer.add_features_bulk(point=(20, 0))
+    assert len(ax.collections) == 2
+
+
+def test_bulk_features_are_dropped_when_shape_is_redefined():
+    drawer = run(BULK)
+    drawer.add_features_bulk(('median',))
+    drawer.store_shape('T', {'type': 'triangle', 'points': [(0, 0), (2, 0), (1, 1)]})
+    assert drawer.annotations_for('T') == ()
+    assert len(drawer.annotations_for('U_0')) == 3
@@ -0,0 +1,79 @@
+import json
+import numpy as np
+import pytest
+
+import GeometryLoader
+from GeometryLoader import load_vertices
+
+SQUARE = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]
+
+
+@pytest.mark.parametrize('extension, dtype', [('.f32', '<f4'), ('.f64', '<f8'), ('.bin', '<f8')])
+def test_binary_files_are_little_endian(tmp_path, extension, dtype):
+    path = tmp_path / f'square{extension}'
+    np.array(SQUARE[:-1], dtype=dtype).tofile(path)
+    vertices = load_vertices(str(path))
+    assert vertices.dtype == np.dtype(dtype)
+    assert vertices.tolist() == SQUARE[:-1]
+
+
+def test_binary_file_with_partial_pair(tmp_path):
+    path = tmp_path / 'broken.f64'
+    np.arange(7, dtype='<f8').tofile(path)
+    with pytest.raises(ValueError):
+        load_vertices(str(path))
+
+
+def collection(*geometries):
+    return {
+        'type': 'FeatureCollection',
+        'name': 'test',
+        'features': [{'type': 'Feature', 'properties': {'id': i}, 'geometry': geometry}
+                     for i, geometry in enumerate(geometries)]
+    }
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Values cross many reads
+    monkeypatch.setattr(GeometryLoader, 'GEOJSON_CHUNK_CHARS', 7)
+
+
+@pytest.mark.parametrize('document', [
+    {'type': 'Polygon', 'coordinates': [SQUARE]},
+    {'type': 'Feature', 'geometry': {'type': 'MultiPolygon', 'coordinates': [[SQUARE]]}},
+    collection({'type': 'Point', 'coordinates': [1, 2]}, None, {'type': 'Polygon', 'coordinates': [SQUARE]}),
+    {'features': [{'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [SQUARE]}}],
+     'type': 'FeatureCollection'},
+    {'type': 'GeometryCollection', 'geometries': [{'type': 'LineString', 'coordinates': [[0.5, 1e-3], [2, 3], [4, 5]]}]},
+])
+def test_geojson_matches_full_decode(tmp_path, small_chunks, document):
+    path = tmp_path / 'shape.geojson'
+    path.write_text(json.dumps(document, indent=1))
+    ring = GeometryLoader._first_polygon(document)
+    expected = np.asarray(ring, dtype=np.float64)[:, :2]
+    if (expected[0] == expected[-1]).all():
+        expected = expected[:-1]
+    assert np.array_equal(load_vertices(str(path)), expected)
+
+
+def test_geojson_stops_reading_at_first_polygon(tmp_path, small_chunks):
+    text = json.dumps(collection({'type': 'Polygon', 'coordinates': [SQUARE]}, {'type': 'Point', 'coordinates': [0, 0]}))
+    path = tmp_path / 'truncated.geojson'
+    # The rest of the file is never decoded
+    path.write_text(text[:text.index('Point') + 10])
+    assert load_vertices(str(path)).tolist() == SQUARE[:-1]
+
+
+def test_geojson_without_polygon(tmp_path, small_chunks):
+    path = tmp_path / 'points.geojson'
+    path.write_text(json.dumps(collection({'type': 'Point', 'coordinates': [0, 0]})))
+    with pytest.raises(ValueError, match='no polygon'):
+        load_vertices(str(path))
+
+
+def test_invalid_geojson(tmp_path):
+    path = tmp_path / 'broken.geojson'
+    path.write_text('{"type": "FeatureCollection", "features": [{"type": ')
+    with pytest.raises(ValueError):
+        load_vertices(str(path))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from bench_intersections import random_scene
+from Intersections import find_overlaps, brute_force_overlaps, candidate_pairs
+
+
+@pytest.mark.parametrize('count, column, large_share', [(2, False, 0), (60, False, 0), (300, False, 0), (60, True, 0),
+                                                        (300, True, 0), (150, False, 0.1)])
+def test_matches_brute_force(count, column, large_share):
+    shapes = random_scene(count, seed=count, column=column, large_share=large_share)
+    assert find_overlaps(shapes) == brute_force_overlaps(shapes)
+
+
+def test_names_order_the_pairs():
+    shapes = random_scene(80, seed=3)
+    names = list(reversed(list(shapes)))
+    assert find_overlaps(shapes, names) == brute_force_overlaps(shapes, names)
+
+
+def test_touching_identical_and_nested_boxes():
+    shapes = {
+        'A': {'type': 'rectangle', 'top_left': (0, 0), 'width': 2, 'height': 2},
+        'B': {'type': 'rectangle', 'top_left': (2, 0), 'width': 2, 'height': 2},
+        'C': {'type': 'rectangle', 'top_left': (2, 0), 'width': 2, 'height': 2},
+        'D': {'type': 'circle', 'center': (10, 10), 'radius': 0},
+        'E': {'type': 'circle', 'center': (10, 10), 'radius': 0},
+        'Big': {'type': 'rectangle', 'top_left': (-100, -100), 'width': 200, 'height': 200},
+    }
+    assert find_overlaps(shapes) == brute_force_overlaps(shapes)
+    assert ('A', 'B') in find_overlaps(shapes)
+
+
+def brute_force_boxes(extents):
+    pairs = set()
+    for i in range(len(extents)):
+        for j in range(i + 1, len(extents)):
+            a, b = extents[i], extents[j]
+            if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                pairs.add((i, j))
+    return pairs
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_candidates_are_exactly_the_meeting_boxes(seed):
+    rng = np.random.default_rng(seed)
+    low = rng.uniform(0, 50, (200, 2))
+    # Mostly small boxes with a few large ones spanning many cells
+    size = rng.exponential(2, (200, 2)) * np.where(rng.uniform(size=(200, 1)) < 0.05, 10, 1)
+    extents = np.hstack([low, low + size])
+    pairs = candidate_pairs(extents)
+    found = {tuple(sorted(pair)) for pair in pairs.tolist()}
+    # Every pair appears once
+    assert len(found) == len(pairs)
+    assert found == brute_force_boxes(extents)
+
+
+def test_column_candidates_stay_local():
+    # Boxes sharing one x range only meet their neighbours in y
+    y = np.arange(1000, dtype=np.float64)
+    extents = np.column_stack([np.zeros(1000), y, np.ones(1000), y + 0.5])
+    assert len(candidate_pairs(extents)) == 0
+
+
+def test_large_boxes_do_not_flood_small_cells():
+    # One box in ten spans the scene: every pair involving one of them is a
+    # real candidate, small boxes only meet their neighbours
+    rng = np.random.default_rng(7)
+    low = rng.uniform(0, 200, (2000, 2))
+    extents = np.hstack([low, low + rng.uniform(1, 4, (2000, 2))])
+    extents[::10] = [-1, -1, 210, 210]
+    pairs = candidate_pairs(extents)
+    found = {tuple(sorted(pair)) for pair in pairs.tolist()}
+    assert len(found) == len(pairs)
+    assert found == brute_force_boxes(extents)
@@ -0,0 +1,49 @@
+import pytest
+from antlr4 import InputStream, CommonTokenStream
+
+import Metrics
+from Accounting import ResourceAccount
+from ExecutionBudget import ExecutionBudget
+from main import parse_and_run
+from DrawShapesLexer import DrawShapesLexer
+from DrawShapesParser import DrawShapesParser
+from SyntaxTree import build_program
+
+
+def build(script):
+    return build_program(DrawShapesParser(CommonTokenStream(DrawShapesLexer(InputStream(script)))).program())
+
+
+def script_counts():
+    return {key[0]: value for key, value in Metrics.SCRIPTS.values.items()}
+
+
+@pytest.mark.parametrize('script, options, status', [
+    ('circle C center (0, 0) radius 1', {}, 'ok'),
+    ('circle C center (0, 0) radius', {}, 'syntax_error'),
+    ('print missing', {}, 'resolve_error'),
+    ('import "no/such/library.dsl"', {}, 'import_error'),
+    ('for i in range(0, 100) { x = i }', {'budget': ExecutionBudget(max_steps=10)}, 'budget_exceeded'),
+])
+def test_script_status(script, options, status):
+    before = script_counts()
+    drawer = parse_and_run(script, show=False, parallel=False, accounting=ResourceAccount(), **options)
+    after = script_counts()
+    assert after.get(status, 0) == before.get(status, 0) + 1
+    assert sum(after.values()) == sum(before.values()) + 1
+    if drawer is not None:
+        assert drawer.accounting_record['status'] == status
+
+
+def test_status_resets_between_resolves():
+    drawer = parse_and_run('print missing', show=False, parallel=False)
+    assert drawer.resolve_status == 'resolve_error'
+    assert drawer.resolve(build('x = 1'))
+    assert drawer.resolve_status is None
+
+
+def test_counts_render_as_prometheus_text():
+    parse_and_run('print missing', show=False, parallel=False)
+    text = Metrics.registry.render()
+    assert '# TYPE cdsl_scripts_total counter' in text
+    assert 'cdsl_scripts_total{status="resolve_error"}' in text
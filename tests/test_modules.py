@@ -0,0 +1,106 @@
+import json
+import os
+import pickle
+import pytest
+
+from Modules import ModuleLoader, ModuleError
+from SyntaxTree import tree_to_data
+from main import parse_and_run
+
+LIBRARY = '''import "helpers.dsl"
+function area(w, h = 2) {
+    for i in range(0, 2) {
+        if (w < 0) { w = 0 - w } else if (w == 0) { w = 1 }
+    }
+    return double(w) * h / 2
+}
+function mark(x) {
+    circle M center (x, [1, 2]) radius 1
+    return x
+}
+'''
+HELPERS = 'function double(x) { return x * 2 }\n'
+
+
+@pytest.fixture
+def library(tmp_path):
+    (tmp_path / 'helpers.dsl').write_text(HELPERS)
+    (tmp_path / 'shapes.dsl').write_text(LIBRARY)
+    return str(tmp_path / 'shapes.dsl')
+
+
+def cache_files(path):
+    directory = os.path.join(os.path.dirname(path), '.dslcache')
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory))
+
+
+def test_disk_cache_round_trip(library):
+    compiled = ModuleLoader().load(library)
+    loader = ModuleLoader()
+    cached = loader.load(library)
+    assert loader.stats == {'memory': 0, 'disk': 2, 'compiled': 0}
+    assert list(cached.functions) == ['double', 'area', 'mark']
+    assert cached.version == compiled.version
+    assert cached.shape_names == compiled.shape_names == {'M'}
+    for name in compiled.functions:
+        assert tree_to_data(cached.functions[name]) == tree_to_data(compiled.functions[name])
+    assert cached.functions['area'].scope_names == compiled.functions['area'].scope_names
+
+
+def test_cache_files_are_json(library):
+    ModuleLoader().load(library)
+    for path in cache_files(library):
+        with open(path) as f:
+            assert json.load(f)['version'] == 2
+
+
+def test_cached_functions_run(library, capsys):
+    ModuleLoader().load(library)
+    script = f'import "{library}"\nprint area(0 - 3)\nprint area(5, 4)\nprint mark(7)'
+    parse_and_run(script, show=False, parallel=False)
+    assert capsys.readouterr().out.split() == ['6.0', '20.0', '7.0']
+
+
+@pytest.mark.parametrize('content', [
+    pickle.dumps((1, 'not a module')),
+    b'{"version": 2, "digest": "x"',
+    None,
+])
+def test_unreadable_cache_is_recompiled(library, content):
+    ModuleLoader().load(library)
+    for path in cache_files(library):
+        if content is None:
+            # A well-formed file naming a class that is not a syntax tree node
+            with open(path) as f:
+                data = json.load(f)
+            if data['definitions']:
+                data['definitions'][0]['node'] = 'Popen'
+            content = json.dumps(data).encode()
+        with open(path, 'wb') as f:
+            f.write(content)
+    loader = ModuleLoader()
+    module = loader.load(library)
+    assert loader.stats['compiled'] == 2
+    assert 'area' in module.functions
+
+
+def test_changed_dependency_invalidates_cache(library, tmp_path):
+    ModuleLoader().load(library)
+    (tmp_path / 'helpers.dsl').write_text('function double(x) { return x * 3 }\n')
+    loader = ModuleLoader()
+    module = loader.load(library)
+    assert loader.stats['disk'] == 0
+    assert loader.stats['compiled'] == 2
+    assert module.functions['double'].ret.value.rest[0][1].value == 3
+
+
+def test_unreadable_module_raises_module_error(tmp_path):
+    (tmp_path / 'folder.dsl').mkdir()
+    (tmp_path / 'latin1.dsl').write_bytes('function f(x) { return x }\n// caf\xe9\n'.encode('latin-1'))
+    loader = ModuleLoader(base_dir=str(tmp_path))
+    with pytest.raises(ModuleError, match='Cannot import'):
+        loader.load('folder.dsl')
+    with pytest.raises(ModuleError, match='not UTF-8'):
+        loader.load('latin1.dsl')
+    with pytest.raises(ModuleError, match='Cannot import'):
+        loader.load('missing.dsl')
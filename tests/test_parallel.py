@@ -0,0 +1,49 @@
+import os
+import pytest
+
+from ExecutionBudget import ExecutionBudget
+from main import parse_and_run
+
+# 3000 iterations split into 8 chunks of 375, two steps per iteration
+SCRIPT = '''for i in range(0, 3000) {
+    circle C center (i, 0) radius 1
+}
+'''
+
+
+@pytest.fixture(autouse=True)
+def two_workers(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+
+
+def test_parallel_loop_matches_serial():
+    parallel = parse_and_run(SCRIPT, show=False, budget=ExecutionBudget())
+    serial = parse_and_run(SCRIPT, show=False, parallel=False, budget=ExecutionBudget())
+    assert parallel.budget.steps == serial.budget.steps
+    assert parallel.statement_count == serial.statement_count
+    assert parallel.shapes['C'] == serial.shapes['C']
+
+
+def test_chunk_stops_at_the_remaining_step_limit():
+    drawer = parse_and_run(SCRIPT, show=False, budget=ExecutionBudget(max_steps=500))
+    error = drawer.budget_error
+    assert error.kind == 'steps'
+    assert error.limit == 500
+    assert error.stats['steps'] > 500
+    # The first chunk already runs out, nothing is merged
+    assert 'C' not in drawer.shapes
+
+
+def test_steps_over_several_chunks_are_enforced_on_merge():
+    drawer = parse_and_run(SCRIPT, show=False, budget=ExecutionBudget(max_steps=1000))
+    error = drawer.budget_error
+    assert error.kind == 'steps'
+    assert error.limit == 1000
+    # The loop statement itself plus two chunks of 750 steps
+    assert drawer.budget.steps == 1501
+
+
+def test_chunk_stops_at_the_parent_deadline():
+    drawer = parse_and_run(SCRIPT, show=False, budget=ExecutionBudget(max_seconds=0))
+    assert drawer.budget_error.kind == 'time'
+    assert drawer.budget_error.limit == 0
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from matplotlib.image import imread
+
+from main import parse_and_run
+from Pipeline import SharedScene, render_shared_scene, run_pipeline
+
+# Each feature lands on T's latest figure, so the first figure never shows
+# the median added after the second draw
+SCRIPT = '''triangle T (0,0), (20,0), (10,15) draw
+add bisector to T from (20, 0)
+rotate T by 30 degrees draw
+add median to T from (0, 0)
+circle C center (5, 5) radius 3 draw
+triangle U (0,0), (4,0), (0,4)
+add perpendicular to U from (0, 0) draw
+'''
+
+
+def images(paths):
+    return [imread(path) for path in sorted(paths)]
+
+
+def serial_images(tmp_path):
+    drawer = parse_and_run(SCRIPT, show=False, parallel=False)
+    return images(drawer.save_figures(str(tmp_path / 'serial')))
+
+
+def test_recorded_draws_keep_features_per_draw():
+    drawer = parse_and_run(SCRIPT, show=False, parallel=False, record_draws=True)
+    assert [(name, annotations) for name, _, annotations in drawer.recorded_draws] == [
+        ('T', (('bisector', 1),)),
+        ('T', (('bisector', 1), ('median', 0))),
+        ('C', ()),
+        ('U', (('perpendicular', 0),)),
+    ]
+
+
+def test_shared_scene_renders_like_serial_run(tmp_path):
+    drawer = parse_and_run(SCRIPT, show=False, parallel=False, record_draws=True)
+    scene = SharedScene(drawer.recorded_draws)
+    try:
+        paths = render_shared_scene(scene.descriptor, str(tmp_path / 'scene'))
+    finally:
+        scene.release()
+    expected = serial_images(tmp_path)
+    assert len(paths) == len(expected) == 4
+    for image, reference in zip(images(paths), expected):
+        assert np.array_equal(image, reference)
+
+
+def test_pipeline_matches_serial_run(tmp_path):
+    results = run_pipeline([SCRIPT, SCRIPT], str(tmp_path / 'pipeline'), workers=1, parallel=False)
+    expected = serial_images(tmp_path)
+    for paths in results:
+        assert [os.path.basename(path) for path in sorted(paths)][0].startswith('0000_')
+        for image, reference in zip(images(paths), expected):
+            assert np.array_equal(image, reference)
@@ -0,0 +1,44 @@
+from main import parse_and_run
+
+
+def run(script):
+    return parse_and_run(script, show=False, parallel=False)
+
+
+def test_loop_reads_name_assigned_later_in_body(capsys):
+    drawer = run('for i in range(0, 3) {\nprint previous\nprevious = i\n}')
+    out = capsys.readouterr().out
+    assert 'Unknown variable' not in out
+    # The first pass reads the initial 0
+    assert out.split() == ['0', '0', '1']
+    assert drawer.variables['previous'] == 2
+
+
+def test_function_loop_reads_local_assigned_later(capsys):
+    run('function total(n) {\nfor i in range(0, n) {\nsum = last + i\nlast = sum\n}\nreturn last\n}\nprint total(4)')
+    out = capsys.readouterr().out
+    assert 'Unknown variable' not in out
+    assert out.split() == ['6']
+
+
+def test_name_never_assigned_is_reported(capsys):
+    run('x = 1\nfor i in range(0, 2) {\nprint missing + x\n}')
+    out = capsys.readouterr().out
+    assert "Unknown variable 'missing'" in out
+    assert 'Execution stopped due to unresolved variables.' in out
+
+
+def test_function_does_not_see_globals(capsys):
+    run('g = 1\nfunction f(x) { return x + g }\nprint f(1)')
+    assert "Unknown variable 'g'" in capsys.readouterr().out
+
+
+def test_name_assigned_in_nested_function_stays_local(capsys):
+    run('function f(x) { inner = x\nreturn inner }\nprint inner')
+    assert "Unknown variable 'inner'" in capsys.readouterr().out
+
+
+def test_shape_names_resolve_without_variables(capsys):
+    drawer = run('circle C center (0, 0) radius 2\nprint C')
+    assert 'Unknown variable' not in capsys.readouterr().out
+    assert 'C' in drawer.shapes
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from main import parse_and_run
+from Snapshot import save_snapshot, load_snapshot, pack_shapes, unpack_shapes
+
+BASE = '''
+size = 10
+name = "base"
+values = [1, 2, 3]
+function grow(x, factor = 2) {
+    return x * factor
+}
+triangle T (0,0), (size,0), (5,8)
+add median to T from (0, 0)
+circle C center (1, 2) radius 3
+rectangle R top-left (0, 0) width 4 height 2
+polygon P vertices ((0,0), (4,0), (4,4), (0,4))
+circle F center ([1, 2], 0) radius 1
+'''
+
+
+def test_pack_round_trip():
+    shapes = {
+        'T': {'type': 'triangle', 'points': [(0, 0), (1, 0), (0, 1)]},
+        'C': {'type': 'circle', 'center': (1, 2), 'radius': 3.0},
+        'R': {'type': 'rectangle', 'top_left': (0, 0), 'width': 4.0, 'height': 2.0},
+        'P': {'type': 'polygon', 'vertices': [(0, 0), (4, 0), (4, 4), (0, 4)]}
+    }
+    unpacked = unpack_shapes(*pack_shapes(shapes))
+    assert list(unpacked) == list(shapes)
+    assert np.array_equal(unpacked['T']['points'], shapes['T']['points'])
+    assert unpacked['C']['radius'] == 3.0
+    assert unpacked['R']['height'] == 2.0
+    assert unpacked['P']['vertices'].shape == (4, 2)
+
+
+def test_snapshot_round_trip(tmp_path):
+    base = parse_and_run(BASE, show=False, parallel=False)
+    path = str(tmp_path / 'base.snap')
+    save_snapshot(base, path)
+
+    loaded = load_snapshot(path, show=False)
+    assert loaded.variables['size'] == 10
+    assert loaded.variables['name'] == 'base'
+    assert np.array_equal(loaded.variables['values'], [1, 2, 3])
+    assert list(loaded.shapes) == list(base.shapes)
+    assert np.allclose(loaded.shapes['T']['points'], base.shapes['T']['points'])
+    assert loaded.annotations == {'T': (('median', 0),)}
+    assert loaded.families == {'F': ['F_0', 'F_1']}
+    assert set(loaded.functions) == {'grow'}
+
+
+def test_script_continues_from_snapshot(tmp_path):
+    path = str(tmp_path / 'base.snap')
+    save_snapshot(parse_and_run(BASE, show=False, parallel=False), path)
+    variant = parse_and_run('x = grow(size)\ny = grow(size, 3)\nscale C by 2', snapshot=path, show=False, parallel=False)
+    assert variant.variables['x'] == 20
+    assert variant.variables['y'] == 30
+    assert variant.shapes['C']['radius'] == 6
+
+
+def test_functions_load_without_parsing(tmp_path, monkeypatch):
+    path = str(tmp_path / 'base.snap')
+    save_snapshot(parse_and_run(BASE + 'function twice(x) {\n    return grow(x) * 2\n}\n', show=False, parallel=False), path)
+    # Loading must not need the parser at all
+    monkeypatch.setattr('DrawShapesParser.DrawShapesParser.program', None)
+    loaded = load_snapshot(path, show=False)
+    assert set(loaded.functions) == {'grow', 'twice'}
+    assert loaded.functions['twice'].params[0].slot == 0
+    monkeypatch.undo()
+    variant = parse_and_run('x = twice(size)', snapshot=path, show=False, parallel=False)
+    assert variant.variables['x'] == 40
+
+
+def test_old_snapshots_are_rejected(tmp_path):
+    path = tmp_path / 'old.snap'
+    path.write_bytes(b'CDSLSNP1' + bytes(8))
+    with pytest.raises(ValueError):
+        load_snapshot(str(path))
+
+
+def test_bulk_features_are_saved(tmp_path):
+    path = str(tmp_path / 'base.snap')
+    base = parse_and_run(BASE, show=False, parallel=False)
+    base.add_features_bulk(('bisector',), point=(20, 0))
+    save_snapshot(base, path)
+    assert load_snapshot(path, show=False).annotations == {'T': (('median', 0), ('bisector', 1))}
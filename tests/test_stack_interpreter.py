@@ -0,0 +1,33 @@
+import pytest
+
+from ExecutionBudget import ExecutionBudget
+from main import parse_and_run
+
+
+def run_both(script, capsys):
+    # Runs the script with both interpreters and returns their printed output
+    results = []
+    for explicit_stack in (False, True):
+        drawer = parse_and_run(script, show=False, parallel=False, explicit_stack=explicit_stack)
+        results.append((capsys.readouterr().out, drawer.statement_count))
+    return results
+
+
+@pytest.mark.parametrize('script', [
+    # A definition calling a function defined before it
+    'function a(x) { return x * 2 }\nfunction b(y) { return a(y) + 1 }\nprint b(3)',
+    # A definition nested in a function body
+    'function a(x) { return x }\nfunction b(y) { function c(z) { return a(z) + 1 }\nreturn c(y) }\nprint b(4)',
+    # Definitions inside a branch
+    'function a(x) { return x }\nif (1 == 1) { function b(y) { return a(y) }\nprint b(5) }',
+])
+def test_definitions_match_recursive_interpreter(script, capsys):
+    recursive, stack = run_both(script, capsys)
+    assert 'Error' not in recursive[0]
+    assert stack == recursive
+
+
+def test_deep_recursion_beyond_python_limit():
+    script = 'function count(n) {\nif (n == 0) { return 0 }\nreturn count(n - 1) + 1\n}\nresult = count(5000)\nprint result'
+    drawer = parse_and_run(script, show=False, parallel=False, explicit_stack=True, budget=ExecutionBudget())
+    assert drawer.budget.deepest_call == 5001
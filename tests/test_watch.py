@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from main import parse_and_run
+from Watch import IncrementalRunner
+
+
+def pixels(figure):
+    figure.canvas.draw()
+    return np.asarray(figure.canvas.buffer_rgba()).copy()
+
+
+def full_run(source, capsys):
+    drawer = parse_and_run(source, show=False, parallel=False)
+    return drawer, capsys.readouterr().out
+
+
+def variables(drawer):
+    return {name: drawer.frame[slot] for name, slot in drawer.global_scope.slots.items()}
+
+
+def incremental_run(runner, source, capsys):
+    stats = runner.update(source)
+    return stats, capsys.readouterr().out
+
+
+@pytest.mark.parametrize('before, after', [
+    # Variable edits
+    ('x = 1\ny = x + 1\nprint y\n', 'x = 2\ny = x + 1\nprint y\n'),
+    # Conditional writes: the untaken branch must not restore the old x
+    ('x = 1\nif (0 > 1) { x = 5 }\nprint x\n', 'x = 2\nif (0 > 1) { x = 5 }\nprint x\n'),
+    ('x = 1\nfor i in range(0, 0) { x = i }\nprint x\n', 'x = 3\nfor i in range(0, 0) { x = i }\nprint x\n'),
+])
+def test_edits_print_like_a_full_run(before, after, capsys):
+    runner = IncrementalRunner(show=False)
+    _, out = incremental_run(runner, before, capsys)
+    assert out == full_run(before, capsys)[1]
+    _, out = incremental_run(runner, after, capsys)
+    drawer, expected = full_run(after, capsys)
+    assert out == expected
+    assert variables(runner.drawer) == variables(drawer)
+
+
+def test_unchanged_statements_are_replayed(capsys):
+    runner = IncrementalRunner(show=False)
+    runner.update('x = 1\ny = 2\nprint y\n')
+    capsys.readouterr()
+    stats, out = incremental_run(runner, 'x = 5\ny = 2\nprint y\n', capsys)
+    assert stats['executed'] == 1
+    assert out == ''
+
+
+def test_feature_edit_redraws_triangle(capsys):
+    source = 'triangle T (0,0), (20,0), (10,15) draw\nadd median to T from (0,0)\n'
+    edited = source.replace('from (0,0)', 'from (20,0)')
+    runner = IncrementalRunner(show=False)
+    runner.update(source)
+    stats, out = incremental_run(runner, edited, capsys)
+    assert stats == {'statements': 2, 'executed': 1, 'rendered': 1}
+    assert 'Warning' not in out
+
+    drawer, _ = full_run(edited, capsys)
+    assert dict(runner.drawer.annotations) == drawer.annotations == {'T': (('median', 1),)}
+    assert np.array_equal(pixels(runner.drawer.figures[-1]), pixels(drawer.figures[-1]))
+
+
+def test_feature_added_after_draw_lands_on_new_figure(capsys):
+    source = 'triangle T (0,0), (20,0), (10,15) draw\nadd median to T from (0,0)\nadd bisector to T from (20,0)\n'
+    edited = source.replace('add bisector to T from (20,0)', 'add bisector to T from (10,15)')
+    runner = IncrementalRunner(show=False)
+    runner.update(source)
+    runner.update(edited)
+    drawer, _ = full_run(edited, capsys)
+    assert dict(runner.drawer.annotations) == drawer.annotations
+    assert np.array_equal(pixels(runner.drawer.figures[-1]), pixels(drawer.figures[-1]))